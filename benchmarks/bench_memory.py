@@ -0,0 +1,73 @@
+import os
+import gc
+import sys
+import weakref
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication, QWidget
+from PySide6.QtCore import QTimer, QEventLoop
+from load_widget import LoadWidget, WorkTask
+
+LOWER_IS_BETTER = ("peak_mb", )
+HIGHER_IS_BETTER = ()
+
+
+def large_func(size):
+    return bytearray(size)
+
+
+def measure_task_release(count, size):
+    # 任务结束且调用者不再引用后，任务、future及结果都应能被回收，不能由线程池一直持有
+    refs = []
+    for i in range(count):
+        task = WorkTask(large_func, size)
+        refs.append(weakref.ref(task))
+        LoadWidget.start_exec_task("", task)
+        del task
+    LoadWidget.thread_pool().waitForDone()
+    QApplication.processEvents()
+    gc.collect()
+    alive_count = sum(ref() is not None for ref in refs)
+    if alive_count > 0:
+        raise RuntimeError(f"{count}个已结束的任务中仍有{alive_count}个未被回收")
+    return {"tasks": count, "alive_tasks": alive_count}
+
+
+def measure_map_memory(count, size, chunksize=4, max_in_flight=4):
+    # 逐个使用并丢弃start_exec_map的结果，内存峰值应只与在途的块数有关，而与结果总数无关
+    bound = (max_in_flight + 2) * chunksize * size
+    tracemalloc.start()
+    try:
+        results = LoadWidget.start_exec_map("", large_func, [size] * count, chunksize, max_in_flight=max_in_flight)
+        for result in results:
+            del result
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    if peak > bound:
+        raise RuntimeError(f"start_exec_map内存峰值{peak / 1e6:.0f}MB，超过在途结果的上限{bound / 1e6:.0f}MB")
+    return {"items": count, "total_mb": count * size / 1e6, "peak_mb": peak / 1e6, "bound_mb": bound / 1e6}
+
+
+def run(scale=1.0):
+    app = QApplication.instance() or QApplication(sys.argv)
+    parent = QWidget()
+    parent.resize(800, 600)
+    parent.show()
+    LoadWidget.get_instance(parent)
+    results = dict()
+    results["task_release"] = measure_task_release(max(5, int(20 * scale)), 10 * 1024 * 1024)
+    results["map_memory"] = measure_map_memory(max(100, int(300 * scale)), 1024 * 1024)
+    parent.close()
+    loop = QEventLoop()
+    QTimer.singleShot(0, loop.quit)
+    loop.exec()
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(name, result)
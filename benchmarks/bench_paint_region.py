@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication, QWidget
+from load_widget import LoadWidget, AnimationClock
+
+
+LOWER_IS_BETTER = ("pixels_per_tick", "ms_per_tick", "cpu_ms_per_tick", "pixels_per_second", "cpu_percent_at_2hz")
+HIGHER_IS_BETTER = ()
+
+
+class CountingLoadWidget(LoadWidget):
+
+    def __init__(self, parent=None, info="") -> None:
+        self.m_paintedPixels = 0
+        super().__init__(parent, info)
+
+    def paintEvent(self, event):
+        for rect in event.region():
+            self.m_paintedPixels += rect.width() * rect.height()
+        return super().paintEvent(event)
+
+
+class FullUpdateLoadWidget(CountingLoadWidget):
+    # 旧版行为：每次动画都使整个遮罩失效
+
+    def on_update_widget(self):
+        super().on_update_widget()
+        self.update()
+
+
+def measure(widget_class, size, ticks):
+    app = QApplication.instance()
+    parent = QWidget()
+    parent.resize(size[0], size[1])
+    parent.show()
+    widget = widget_class(parent)
+    widget.show()
+    app.processEvents()
+    AnimationClock.instance().unregister(widget)
+    widget.m_paintedPixels = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(ticks):
+        widget.on_update_widget()
+        app.processEvents()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    result = {
+        "pixels_per_tick": widget.m_paintedPixels / ticks,
+        "ms_per_tick": wall / ticks * 1000,
+        "cpu_ms_per_tick": cpu / ticks * 1000,
+        # 按500ms的动画间隔换算
+        "pixels_per_second": widget.m_paintedPixels / ticks * 2,
+        "cpu_percent_at_2hz": cpu / ticks * 2 * 100,
+    }
+    parent.close()
+    app.processEvents()
+    return result
+
+
+def run(scale=1.0, sizes=((1280, 720), (1920, 1080), (3840, 2160))):
+    QApplication.instance() or QApplication(sys.argv)
+    ticks = max(10, int(200 * scale))
+    results = dict()
+    for size in sizes:
+        name = f"{size[0]}x{size[1]}"
+        results[f"full_update_{name}"] = measure(FullUpdateLoadWidget, size, ticks)
+        results[f"badge_update_{name}"] = measure(CountingLoadWidget, size, ticks)
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:<26} {result['pixels_per_second']:14.0f} px/s  {result['ms_per_tick']:8.3f} ms/tick  "
+              f"cpu {result['cpu_percent_at_2hz']:6.3f}%")
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+LOWER_IS_BETTER = ("wall_s", )
+HIGHER_IS_BETTER = ("cache_hit_count", "speedup")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中运行，避免setuptools的全局状态及大量编译输出影响当前进程
+DRIVER = """
+import sys
+import json
+import time
+sys.path.insert(0, sys.argv[1])
+import setup
+builder = setup.Setup([], "Bench", "1.0.0", "bench")
+builder.m_compile_engine = sys.argv[2]
+builder.m_build_cache_enable = sys.argv[3] == "1"
+start = time.perf_counter()
+builder._getPackFile()
+builder._compileOrCopyFile()
+wall = time.perf_counter() - start
+builder._removePackageAndBuildDir()
+print("BENCH_RESULT " + json.dumps({"wall_s": wall, "cache_hit_count": builder.m_build_cache_hit_count}))
+"""
+
+MODULE_SOURCE = """
+import math
+
+
+class Shape{index}:
+
+    def __init__(self, width, height):
+        self.m_width = width
+        self.m_height = height
+
+    def area(self):
+        return self.m_width * self.m_height
+
+    def scaled(self, factor):
+        return Shape{index}(self.m_width * factor, self.m_height * factor)
+
+
+def distance{index}(points):
+    total = 0.0
+    for i in range(1, len(points)):
+        total += math.hypot(points[i][0] - points[i - 1][0], points[i][1] - points[i - 1][1])
+    return total
+"""
+
+
+def create_project(path, module_count):
+    shutil.copy(os.path.join(ROOT_DIR, "setup.py"), path)
+    for package_index in range(max(1, module_count // 8)):
+        package_path = os.path.join(path, f"pkg{package_index}")
+        os.makedirs(package_path)
+        open(os.path.join(package_path, "__init__.py"), "w").close()
+    for index in range(module_count):
+        with open(os.path.join(path, f"pkg{index % max(1, module_count // 8)}", f"module{index}.py"), "w") as f:
+            f.write(MODULE_SOURCE.format(index=index))
+
+
+def measure(path, engine, cache):
+    process = subprocess.run([sys.executable, "-c", DRIVER, path, engine, "1" if cache else "0"],
+                             cwd=path,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             text=True)
+    for line in process.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    raise RuntimeError(process.stderr[-2000:])
+
+
+def run(scale=1.0):
+    module_count = max(4, int(8 * scale))
+    path = tempfile.mkdtemp(prefix="bench_setup_")
+    try:
+        create_project(path, module_count)
+        results = {"module_count": module_count}
+        results["legacy_thread"] = measure(path, "thread", False)
+        results["process_batched"] = measure(path, "process", False)
+        measure(path, "process", True)
+        results["process_cached"] = measure(path, "process", True)
+        results["speedup"] = results["legacy_thread"]["wall_s"] / results["process_batched"]["wall_s"]
+        return results
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(name, result)
@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import compileall
+import subprocess
+
+LOWER_IS_BETTER = ("import_p50_ms", "import_min_ms", "process_p50_ms", "process_min_ms")
+HIGHER_IS_BETTER = ()
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中编译，得到打包目录中的程序(不生成deb)
+DRIVER = """
+import sys
+import shutil
+sys.path.insert(0, sys.argv[1])
+import setup
+builder = setup.Setup([], "Bench", "1.0.0", "bench")
+builder.m_deb_writer = "dpkg"
+builder.m_build_cache_enable = False
+builder.m_bundle_enable = sys.argv[3] == "1"
+builder._getPackFile()
+builder._compileOrCopyFile()
+shutil.copytree(builder.m_pack_install_dir_path, sys.argv[2])
+builder._removePackageAndBuildDir()
+"""
+
+MODULE_SOURCE = """
+import math
+
+
+class Point{index}:
+
+    def __init__(self, x, y):
+        self.m_x = x
+        self.m_y = y
+
+    def length(self):
+        return math.hypot(self.m_x, self.m_y)
+
+
+def total{index}(points):
+    return sum(point.length() for point in points)
+"""
+
+# 打包时合并模块的导入语句插入在main.py最前面，脚本内计时无法包含这部分，因此统计进程总耗时
+MAIN_SOURCE = """# -*- coding: utf-8 -*-
+{imports}
+"""
+
+
+def create_project(path, module_count):
+    shutil.copy(os.path.join(ROOT_DIR, "setup.py"), path)
+    package_count = max(1, module_count // 8)
+    imports = []
+    for package_index in range(package_count):
+        package_path = os.path.join(path, f"pkg{package_index}")
+        os.makedirs(package_path)
+        open(os.path.join(package_path, "__init__.py"), "w").close()
+    for index in range(module_count):
+        package_name = f"pkg{index % package_count}"
+        with open(os.path.join(path, package_name, f"module{index}.py"), "w") as f:
+            f.write(MODULE_SOURCE.format(index=index))
+        imports.append(f"import {package_name}.module{index}")
+    with open(os.path.join(path, "main.py"), "w") as f:
+        f.write(MAIN_SOURCE.format(imports="\n".join(imports)))
+
+
+def build(path, output_path, bundle):
+    process = subprocess.run([sys.executable, "-c", DRIVER, path, output_path, "1" if bundle else "0"],
+                             cwd=path,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             text=True)
+    if process.returncode != 0 or os.path.exists(output_path) == False:
+        raise RuntimeError(process.stderr[-2000:])
+
+
+def build_pyc(path, output_path):
+    shutil.copytree(path, output_path, ignore=shutil.ignore_patterns("setup.py"))
+    compileall.compile_dir(output_path, quiet=1)
+
+
+def measure(path, names, count):
+    # 每次启动新的解释器运行main.py，导入耗时为进程总耗时减去空解释器的启动耗时；
+    # 各个版本轮流运行，避免机器负载的变化只影响其中一个版本
+    commands = {"interpreter": ([sys.executable, "-c", ""], path)}
+    for name in names:
+        commands[name] = ([sys.executable, "main.py"], os.path.join(path, name))
+    costs = {name: [] for name in commands}
+    for _ in range(count):
+        for name, (command, cwd) in commands.items():
+            start = time.perf_counter()
+            subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+            costs[name].append((time.perf_counter() - start) * 1000)
+    results = dict()
+    for name, values in costs.items():
+        values.sort()
+        results[name] = {"process_p50_ms": values[len(values) // 2], "process_min_ms": values[0]}
+    for name in names:
+        results[name]["import_p50_ms"] = results[name]["process_p50_ms"] - results["interpreter"]["process_p50_ms"]
+        results[name]["import_min_ms"] = results[name]["process_min_ms"] - results["interpreter"]["process_min_ms"]
+    return results
+
+
+def run(scale=1.0):
+    module_count = max(8, int(24 * scale))
+    count = max(5, int(20 * scale))
+    path = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        project_path = os.path.join(path, "project")
+        os.makedirs(project_path)
+        create_project(project_path, module_count)
+        build(project_path, os.path.join(path, "per_file_so"), False)
+        build(project_path, os.path.join(path, "bundled_so"), True)
+        build_pyc(project_path, os.path.join(path, "pyc"))
+        results = {"module_count": module_count}
+        results.update(measure(path, ("per_file_so", "bundled_so", "pyc"), count))
+        return results
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
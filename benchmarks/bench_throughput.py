@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication, QWidget
+from PySide6.QtCore import QTimer, QEventLoop, QElapsedTimer
+from load_widget import LoadWidget, WorkTask
+
+
+LOWER_IS_BETTER = ("wall_s", "max_gap_ms", "p95_gap_ms", "stall_ms")
+HIGHER_IS_BETTER = ("tasks_per_second", "callbacks")
+
+
+def tiny_func(value):
+    return value
+
+
+def io_func(value):
+    time.sleep(0.005)
+    return value
+
+
+def cpu_func(value):
+    total = 0
+    for i in range(200000):
+        total += i * i
+    return total + value
+
+
+def submit_all(func, count, backend):
+    futures = []
+    for i in range(count):
+        task = WorkTask(func, i)
+        task.set_backend(backend)
+        futures.append(LoadWidget.submit_task("", task))
+    for future in futures:
+        future.result()
+
+
+def measure_throughput(func, count, backend=WorkTask.THREAD_BACKEND, blocking=False):
+    start = time.perf_counter()
+    if blocking:
+        for i in range(count):
+            task = WorkTask(func, i)
+            task.set_backend(backend)
+            LoadWidget.start_exec_task("", task)
+    else:
+        submit_all(func, count, backend)
+    wall = time.perf_counter() - start
+    return {"tasks": count, "wall_s": wall, "tasks_per_second": count / wall}
+
+
+def measure_gui_stall(func, count, backend):
+    # 任务执行期间以1ms定时器探测GUI线程，两次触发的间隔越大说明GUI线程卡顿越严重
+    gaps = []
+    elapsed = QElapsedTimer()
+    elapsed.start()
+    last = [elapsed.nsecsElapsed()]
+
+    def on_tick():
+        now = elapsed.nsecsElapsed()
+        gaps.append((now - last[0]) / 1e6)
+        last[0] = now
+
+    timer = QTimer()
+    timer.setInterval(1)
+    timer.timeout.connect(on_tick)
+    timer.start()
+    submit_all(func, count, backend)
+    timer.stop()
+    gaps.sort()
+    if len(gaps) == 0:
+        gaps = [0.0]
+    return {
+        "ticks": len(gaps),
+        "max_gap_ms": gaps[-1],
+        "p95_gap_ms": gaps[int(len(gaps) * 0.95)],
+        "stall_ms": sum(gap - 1 for gap in gaps if gap > 16),
+    }
+
+
+def progress_func(count, delay, reporter=None):
+    for i in range(count):
+        reporter.report(i)
+        time.sleep(delay)
+    return count
+
+
+def measure_progress_rate(duration, interval=50):
+    # 工作线程持续回报进度，GUI线程应大约每interval毫秒收到一次中间进度，而不是只在开始和结束时收到
+    count = 100
+    task = WorkTask(progress_func, count, duration / count)
+    task.set_reporter_arg("reporter", interval)
+    stamps = []
+    future = LoadWidget.submit_task("", task)
+    future.add_progress_callback(lambda value, text, partials: stamps.append(time.perf_counter()))
+    start = time.perf_counter()
+    future.result()
+    wall = time.perf_counter() - start
+    gaps = [(stamps[i] - stamps[i - 1]) * 1000 for i in range(1, len(stamps))] or [wall * 1000]
+    if max(gaps) > interval * 10:
+        raise RuntimeError(f"进度回报中断，两次进度回调最大间隔{max(gaps):.0f}ms，节流间隔{interval}ms")
+    return {
+        "callbacks": len(stamps),
+        "expected_callbacks": int(wall * 1000 / interval),
+        "max_gap_ms": max(gaps),
+    }
+
+
+def run(scale=1.0):
+    app = QApplication.instance() or QApplication(sys.argv)
+    parent = QWidget()
+    parent.resize(1280, 720)
+    parent.show()
+    LoadWidget.get_instance(parent)
+    count = max(10, int(200 * scale))
+    results = dict()
+    results["tiny_blocking"] = measure_throughput(tiny_func, count, blocking=True)
+    results["tiny_parallel"] = measure_throughput(tiny_func, count)
+    results["io_parallel"] = measure_throughput(io_func, count)
+    results["cpu_thread"] = measure_throughput(cpu_func, count // 4)
+    results["cpu_process"] = measure_throughput(cpu_func, count // 4, WorkTask.PROCESS_BACKEND)
+    results["stall_cpu_thread"] = measure_gui_stall(cpu_func, count // 4, WorkTask.THREAD_BACKEND)
+    results["stall_cpu_process"] = measure_gui_stall(cpu_func, count // 4, WorkTask.PROCESS_BACKEND)
+    results["progress_rate"] = measure_progress_rate(max(0.5, scale))
+    parent.close()
+    loop = QEventLoop()
+    QTimer.singleShot(0, loop.quit)
+    loop.exec()
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(name, result)
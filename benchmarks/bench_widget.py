@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication, QWidget
+from load_widget import LoadWidget, AnimationClock
+
+
+LOWER_IS_BETTER = ("full_paint_us", "badge_paint_us", "without_overlay_us", "with_overlay_us")
+HIGHER_IS_BETTER = ()
+
+
+def measure_paint(size, count):
+    app = QApplication.instance()
+    parent = QWidget()
+    parent.resize(size[0], size[1])
+    parent.show()
+    widget = LoadWidget(parent)
+    widget.show()
+    app.processEvents()
+    AnimationClock.instance().unregister(widget)
+    widget.repaint()
+    result = dict()
+    start = time.perf_counter()
+    for _ in range(count):
+        widget.repaint()
+    result["full_paint_us"] = (time.perf_counter() - start) / count * 1e6
+    start = time.perf_counter()
+    for _ in range(count):
+        widget.on_update_widget()
+        widget.repaint(widget.m_badgeRect)
+    result["badge_paint_us"] = (time.perf_counter() - start) / count * 1e6
+    parent.close()
+    app.processEvents()
+    return result
+
+
+def measure_resize(count, with_overlay):
+    # 父窗口快速连续改变大小，比较有无遮罩(eventFilter)时每次改变大小的耗时
+    app = QApplication.instance()
+    parent = QWidget()
+    parent.resize(800, 600)
+    parent.show()
+    if with_overlay:
+        widget = LoadWidget(parent)
+        widget.show()
+    app.processEvents()
+    start = time.perf_counter()
+    for i in range(count):
+        parent.resize(800 + i % 200, 600 + i % 100)
+        app.processEvents()
+    cost = (time.perf_counter() - start) / count * 1e6
+    parent.close()
+    app.processEvents()
+    return cost
+
+
+def run(scale=1.0, sizes=((1280, 720), (1920, 1080), (3840, 2160))):
+    QApplication.instance() or QApplication(sys.argv)
+    count = max(10, int(100 * scale))
+    results = dict()
+    for size in sizes:
+        results[f"paint_{size[0]}x{size[1]}"] = measure_paint(size, count)
+    without_overlay = measure_resize(count * 2, False)
+    with_overlay = measure_resize(count * 2, True)
+    results["parent_resize"] = {
+        "without_overlay_us": without_overlay,
+        "with_overlay_us": with_overlay,
+        "event_filter_overhead_us": with_overlay - without_overlay,
+    }
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(name, result)
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication, QWidget
+from PySide6.QtCore import QEventLoop, QThread, Signal
+from load_widget import LoadWidget
+
+
+LOWER_IS_BETTER = ("mean_us", "p50_us", "p95_us")
+HIGHER_IS_BETTER = ()
+
+
+# 旧版load_widget的工作线程，仅作为基准对比保留在这里
+class WorkThread(QThread):
+    send_finish_sig = Signal(list)
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.m_func = None
+        self.m_args = None
+        self.m_kwargs = None
+
+    def set_func(self, func, *args, **kwargs):
+        self.m_func = func
+        self.m_args = args
+        self.m_kwargs = kwargs
+
+    def run(self):
+        try:
+            result = None
+            if self.m_func:
+                if len(self.m_args) > 0 and len(self.m_kwargs) > 0:
+                    result = self.m_func(*self.m_args, **self.m_kwargs)
+                elif len(self.m_args) > 0:
+                    result = self.m_func(*self.m_args)
+                elif len(self.m_kwargs) > 0:
+                    result = self.m_func(**self.m_kwargs)
+                else:
+                    result = self.m_func()
+        except Exception as e:
+            print(f"load_widget线程函数执行出错:{e}")
+        finally:
+            self.m_func = None
+            self.m_args = None
+            self.m_kwargs = None
+            self.send_finish_sig.emit([result])
+
+
+def quick_func(value):
+    return value
+
+
+def legacy_exec_func(widget, thread, func, *args):
+    # 复现旧版set_func：每次调用都start线程，结束后quit()/wait()阻塞等待线程退出
+    results = []
+    loop = QEventLoop()
+
+    def recv(result):
+        results.extend(result)
+        loop.quit()
+
+    thread.send_finish_sig.connect(recv)
+    thread.set_func(func, *args)
+    thread.start()
+    widget.show()
+    loop.exec()
+    thread.quit()
+    thread.wait()
+    widget.hide()
+    thread.send_finish_sig.disconnect(recv)
+    return results[0]
+
+
+def measure(call, count):
+    costs = []
+    for i in range(count):
+        start = time.perf_counter()
+        call(i)
+        costs.append(time.perf_counter() - start)
+    costs.sort()
+    return {
+        "mean_us": sum(costs) / len(costs) * 1e6,
+        "p50_us": costs[len(costs) // 2] * 1e6,
+        "p95_us": costs[int(len(costs) * 0.95)] * 1e6,
+    }
+
+
+def run(scale=1.0):
+    app = QApplication.instance() or QApplication(sys.argv)
+    count = max(10, int(500 * scale))
+    parent = QWidget()
+    parent.resize(800, 600)
+    parent.show()
+    widget = LoadWidget.get_instance(parent)
+
+    thread = WorkThread()
+    results = dict()
+    results["start_stop_thread"] = measure(lambda i: legacy_exec_func(widget, thread, quick_func, i), count)
+
+    LoadWidget.set_persistent_workers(False)
+    LoadWidget.thread_pool().waitForDone()
+    LoadWidget.thread_pool().clear()
+    results["thread_pool"] = measure(lambda i: LoadWidget.start_exec_func("", quick_func, i), count)
+
+    LoadWidget.set_persistent_workers(True)
+    results["persistent_workers"] = measure(lambda i: LoadWidget.start_exec_func("", quick_func, i), count)
+    LoadWidget.set_persistent_workers(False)
+
+    parent.close()
+    app.processEvents()
+    return results
+
+
+if __name__ == "__main__":
+    for name, result in run().items():
+        print(f"{name:<20} mean {result['mean_us']:9.1f}us  p50 {result['p50_us']:9.1f}us  p95 {result['p95_us']:9.1f}us")
@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import argparse
+import platform
+from datetime import datetime
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PySide6.QtCore import qVersion
+import bench_worker_latency
+import bench_paint_region
+import bench_throughput
+import bench_widget
+import bench_setup
+import bench_startup
+import bench_memory
+
+BENCHMARKS = {
+    "worker_latency": bench_worker_latency,
+    "paint_region": bench_paint_region,
+    "throughput": bench_throughput,
+    "widget": bench_widget,
+    "setup": bench_setup,
+    "startup": bench_startup,
+    "memory": bench_memory,
+}
+
+
+
+def flatten(results, prefix=""):
+    values = dict()
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            values.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            values[name] = value
+    return values
+
+
+def compare(baseline, current, tolerance):
+    # 每个测试模块用LOWER_IS_BETTER/HIGHER_IS_BETTER按指标名声明比较方向，未声明的指标只记录不比较
+    regressions = []
+    baseline_values = flatten(baseline["results"])
+    for name, value in flatten(current["results"]).items():
+        old_value = baseline_values.get(name)
+        if old_value is None or old_value == 0:
+            continue
+        module = BENCHMARKS[name.split(".")[0]]
+        metric = name.split(".")[-1]
+        if metric in module.HIGHER_IS_BETTER:
+            change = (old_value - value) / old_value
+        elif metric in module.LOWER_IS_BETTER:
+            change = (value - old_value) / old_value
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": name, "baseline": old_value, "current": value, "change": change})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load_widget无界面性能测试")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="只运行指定的测试")
+    parser.add_argument("--scale", type=float, default=1.0, help="迭代次数缩放系数")
+    parser.add_argument("--output", help="结果JSON文件路径，默认输出到标准输出")
+    parser.add_argument("--compare", help="与基线JSON比较，出现退化时返回非零")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "qt": qVersion(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "qpa_platform": os.environ.get("QT_QPA_PLATFORM"),
+        },
+        "results": dict(),
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"running {name}...", file=sys.stderr)
+        report["results"][name] = BENCHMARKS[name].run(scale=args.scale)
+
+    content = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(content)
+    else:
+        print(content)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for regression in regressions:
+            print(f"regression {regression['metric']}: {regression['baseline']:.3f} -> {regression['current']:.3f} "
+                  f"(+{regression['change'] * 100:.1f}%)",
+                  file=sys.stderr)
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
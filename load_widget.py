@@ -1,71 +1,920 @@
+import os
 import sys
+import time
+import asyncio
+import json
+import math
+import heapq
+import functools
+import itertools
+import collections
+import threading
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+import shiboken6
 from PySide6.QtWidgets import QApplication, QWidget, QPushButton
-from PySide6.QtGui import QCloseEvent, QHideEvent, QPainter, QColor, QResizeEvent, QPainterPath, QShowEvent
-from PySide6.QtCore import QEvent, QObject, Qt, QRect, QPoint, QSize, QTimer, QThread, Signal, QEventLoop
+from PySide6.QtGui import (QGuiApplication, QCloseEvent, QHideEvent, QPainter, QColor, QResizeEvent, QPainterPath,
+                           QShowEvent, QFont, QPixmap, QPixmapCache)
+from PySide6.QtCore import (QEvent, QObject, Qt, QRect, QPoint, QTimer, QThread, Signal, QEventLoop, QRunnable,
+                            QThreadPool, QElapsedTimer)
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-class WorkThread(QThread):
+
+class SharedArray:
+    # 子进程通过共享内存返回的numpy数组描述，只包含共享内存名称、形状和类型
+
+    def __init__(self, name, shape, dtype) -> None:
+        self.m_name = name
+        self.m_shape = shape
+        self.m_dtype = dtype
+
+
+def _share_result(result, threshold):
+    if numpy is None:
+        return result
+    if isinstance(result, numpy.ndarray):
+        if result.nbytes < threshold or result.dtype.hasobject:
+            return result
+        shm = shared_memory.SharedMemory(create=True, size=result.nbytes)
+        if os.name == "posix":
+            # 共享内存由主进程读取后unlink，子进程不登记，避免子进程退出时被resource_tracker提前清理或重复unlink
+            resource_tracker.unregister(shm._name, "shared_memory")
+        try:
+            numpy.ndarray(result.shape, result.dtype, buffer=shm.buf)[...] = result
+            return SharedArray(shm.name, result.shape, result.dtype.str)
+        finally:
+            shm.close()
+    if isinstance(result, (list, tuple)):
+        return type(result)(_share_result(item, threshold) for item in result)
+    if isinstance(result, dict):
+        return {key: _share_result(value, threshold) for key, value in result.items()}
+    return result
+
+
+def _restore_result(result):
+    if isinstance(result, SharedArray):
+        shm = shared_memory.SharedMemory(name=result.m_name)
+        try:
+            array = numpy.ndarray(result.m_shape, numpy.dtype(result.m_dtype), buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        return array
+    if isinstance(result, (list, tuple)):
+        return type(result)(_restore_result(item) for item in result)
+    if isinstance(result, dict):
+        return {key: _restore_result(value) for key, value in result.items()}
+    return result
+
+
+def _map_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def _process_call(func, args, kwargs, threshold):
+    # 在子进程中执行，较大的numpy结果放入共享内存，避免pickle整个数组；同时返回函数在子进程中的执行耗时
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    run_time = time.perf_counter() - start
+    return _share_result(result, threshold), run_time
+
+
+class LoadFuture:
+    # 任务结果的非阻塞句柄，回调均在GUI线程中执行
+
+    def __init__(self, cancel_func=None) -> None:
+        self.m_cancelFunc = cancel_func
+        self.m_done = False
+        self.m_result = None
+        self.m_exception = None
+        self.m_callbacks = []
+        self.m_progressCallbacks = []
+
+    def done(self):
+        return self.m_done
+
+    def result(self):
+        # 未完成时在局部事件循环中等待，与set_func的阻塞行为一致
+        if not self.m_done:
+            loop = QEventLoop()
+            self.add_done_callback(lambda future: loop.quit())
+            loop.exec()
+        if self.m_exception is not None:
+            raise self.m_exception
+        return self.m_result
+
+    def exception(self):
+        return self.m_exception
+
+    def cancel(self):
+        if self.m_done or self.m_cancelFunc is None:
+            return False
+        return self.m_cancelFunc()
+
+    def cancelled(self):
+        return isinstance(self.m_exception, TaskCancelledError)
+
+    def add_done_callback(self, callback):
+        if self.m_done:
+            callback(self)
+        else:
+            self.m_callbacks.append(callback)
+
+    def add_progress_callback(self, callback):
+        # callback(value, text, partials)，partials为自上次回调以来新增的部分结果
+        self.m_progressCallbacks.append(callback)
+
+    def report_progress(self, value, text, partials):
+        for callback in self.m_progressCallbacks:
+            try:
+                callback(value, text, partials)
+            except Exception as e:
+                print(f"load_widget进度回调执行出错:{e}")
+
+    def set_result(self, result, exception=None):
+        if self.m_done:
+            return
+        self.m_done = True
+        self.m_result = result
+        self.m_exception = exception
+        self.m_progressCallbacks = []
+        callbacks, self.m_callbacks = self.m_callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"load_widget回调函数执行出错:{e}")
+
+    def __await__(self):
+        # 需要运行在与Qt集成的asyncio事件循环中(如qasync或QtAsyncio)
+        loop = asyncio.get_running_loop()
+        aio_future = loop.create_future()
+
+        def on_done(future):
+            def transfer():
+                if aio_future.done():
+                    return
+                if future.m_exception is not None:
+                    aio_future.set_exception(future.m_exception)
+                else:
+                    aio_future.set_result(future.m_result)
+
+            loop.call_soon_threadsafe(transfer)
+
+        self.add_done_callback(on_done)
+        return aio_future.__await__()
+
+
+class ProgressReporter:
+    # 在工作线程中调用，进度和部分结果先在本地合并，任意时刻最多只有一个进度信号在GUI线程的事件队列中，
+    # GUI线程处理后至少间隔interval毫秒才接收下一次更新
+
+    def __init__(self, send_progress_sig, interval=50) -> None:
+        self.m_lock = threading.Lock()
+        self.m_sendProgressSig = send_progress_sig
+        self.m_interval = interval
+        self.m_value = None
+        self.m_text = None
+        self.m_partials = []
+        self.m_dirty = False
+        self.m_pending = False
+
+    def report(self, value=None, text=None):
+        # value为0~100的百分比，text为显示在提示中的文字
+        with self.m_lock:
+            if value is not None:
+                self.m_value = value
+            if text is not None:
+                self.m_text = text
+            self._mark_dirty()
+
+    def add_partial(self, partial):
+        with self.m_lock:
+            self.m_partials.append(partial)
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        self.m_dirty = True
+        if not self.m_pending:
+            self.m_pending = True
+            self.m_sendProgressSig.emit()
+
+    def take(self):
+        with self.m_lock:
+            self.m_dirty = False
+            partials, self.m_partials = self.m_partials, []
+            return self.m_value, self.m_text, partials
+
+    def is_dirty(self):
+        with self.m_lock:
+            return self.m_dirty
+
+    def arm_throttle(self, callback):
+        QTimer.singleShot(self.m_interval, functools.partial(self._on_throttle_timeout, callback))
+
+    def _on_throttle_timeout(self, callback):
+        with self.m_lock:
+            if not self.m_dirty:
+                self.m_pending = False
+                return
+        # 送出间隔期内合并的更新后继续计时，直到某个间隔内没有新的更新
+        callback()
+        self.arm_throttle(callback)
+
+
+class WorkSignals(QObject):
     send_finish_sig = Signal(list)
+    send_progress_sig = Signal()
+    send_process_done_sig = Signal()
 
-    def __init__(self, parent=None) -> None:
-        super().__init__(parent)
-        self.m_func = None
-        self.m_args = None
-        self.m_kwargs = None
 
-    def set_func(self, func, *args, **kwargs):
+class TaskCancelledError(Exception):
+    pass
+
+
+class TaskTimeoutError(TaskCancelledError):
+    pass
+
+
+class CancelToken:
+    # 协作式取消标记，函数在循环中检查is_cancelled()或调用raise_if_cancelled()尽快退出
+
+    def __init__(self) -> None:
+        self.m_event = threading.Event()
+
+    def cancel(self):
+        self.m_event.set()
+
+    def is_cancelled(self):
+        return self.m_event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.m_event.is_set():
+            raise TaskCancelledError("任务已取消")
+
+
+class Histogram:
+    # 按2的幂分桶的耗时直方图，单位微秒，分位数为所在桶的上界
+
+    def __init__(self) -> None:
+        self.m_count = 0
+        self.m_sum = 0.0
+        self.m_min = None
+        self.m_max = None
+        self.m_buckets = collections.Counter()
+
+    def record(self, seconds):
+        microseconds = seconds * 1e6
+        self.m_count += 1
+        self.m_sum += microseconds
+        self.m_min = microseconds if self.m_min is None else min(self.m_min, microseconds)
+        self.m_max = microseconds if self.m_max is None else max(self.m_max, microseconds)
+        self.m_buckets[max(0, math.ceil(math.log2(microseconds))) if microseconds > 1 else 0] += 1
+
+    def percentile(self, percent):
+        if self.m_count == 0:
+            return 0.0
+        target = self.m_count * percent / 100
+        count = 0
+        for bucket in sorted(self.m_buckets):
+            count += self.m_buckets[bucket]
+            if count >= target:
+                return min(float(2**bucket), self.m_max)
+        return self.m_max
+
+    def export(self):
+        return {
+            "count": self.m_count,
+            "mean_us": self.m_sum / self.m_count if self.m_count > 0 else 0.0,
+            "min_us": self.m_min or 0.0,
+            "max_us": self.m_max or 0.0,
+            "p50_us": self.percentile(50),
+            "p95_us": self.percentile(95),
+            "p99_us": self.percentile(99),
+            "buckets": {f"le_{2**bucket}us": count for bucket, count in sorted(self.m_buckets.items())},
+        }
+
+
+class LoadMetrics:
+    # 通过LoadWidget.set_metrics启用，未启用时各处只多一次None判断
+    # queue_wait:提交到开始执行 run_time:执行耗时 delivery_latency:结果从工作线程送达GUI线程
+    # caller_wait:set_func调用方等待时间 paint_time:每帧paintEvent耗时
+
+    def __init__(self) -> None:
+        self.m_lock = threading.Lock()
+        self.m_histograms = collections.defaultdict(Histogram)
+        self.m_exceptions = collections.Counter()
+        self.m_cancelledCount = 0
+        self.m_listeners = []
+
+    def add_listener(self, listener):
+        # listener(name, seconds)，在记录数据的线程中调用
+        self.m_listeners.append(listener)
+
+    def record(self, name, seconds):
+        with self.m_lock:
+            self.m_histograms[name].record(seconds)
+        for listener in self.m_listeners:
+            listener(name, seconds)
+
+    def record_exception(self, exception):
+        with self.m_lock:
+            if isinstance(exception, (TaskCancelledError, concurrent.futures.CancelledError)):
+                self.m_cancelledCount += 1
+            else:
+                self.m_exceptions[type(exception).__name__] += 1
+
+    def reset(self):
+        with self.m_lock:
+            self.m_histograms.clear()
+            self.m_exceptions.clear()
+            self.m_cancelledCount = 0
+
+    def export(self):
+        with self.m_lock:
+            return {
+                "histograms": {name: histogram.export() for name, histogram in self.m_histograms.items()},
+                "exceptions": dict(self.m_exceptions),
+                "cancelled": self.m_cancelledCount,
+            }
+
+    def export_json(self, path=None):
+        content = json.dumps(self.export(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(content)
+        return content
+
+
+class ResultCache:
+    # 以函数及参数为键的结果缓存，超出max_size时淘汰最久未使用的结果，ttl为过期秒数，0表示不过期
+
+    def __init__(self, max_size=128, ttl=0) -> None:
+        self.m_maxSize = max_size
+        self.m_ttl = ttl
+        self.m_items = collections.OrderedDict()
+        self.m_lock = threading.Lock()
+        self.m_hits = 0
+        self.m_misses = 0
+        self.m_evictions = 0
+
+    @staticmethod
+    def make_key(func, args, kwargs):
+        # 参数不可哈希时返回None，该次调用不使用缓存
+        key = (func, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        with self.m_lock:
+            item = self.m_items.get(key)
+            if item is not None and (item[1] == 0 or item[1] > time.monotonic()):
+                self.m_items.move_to_end(key)
+                self.m_hits += 1
+                return True, item[0]
+            if item is not None:
+                del self.m_items[key]
+            self.m_misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self.m_lock:
+            expire_time = time.monotonic() + self.m_ttl if self.m_ttl > 0 else 0
+            self.m_items[key] = (value, expire_time)
+            self.m_items.move_to_end(key)
+            while len(self.m_items) > self.m_maxSize:
+                self.m_items.popitem(last=False)
+                self.m_evictions += 1
+
+    def invalidate(self, func, *args, **kwargs):
+        with self.m_lock:
+            self.m_items.pop(ResultCache.make_key(func, args, kwargs), None)
+
+    def invalidate_func(self, func):
+        with self.m_lock:
+            for key in [key for key in self.m_items if key[0] == func]:
+                del self.m_items[key]
+
+    def clear(self):
+        with self.m_lock:
+            self.m_items.clear()
+
+    def statistics(self):
+        with self.m_lock:
+            total = self.m_hits + self.m_misses
+            return {
+                "hits": self.m_hits,
+                "misses": self.m_misses,
+                "evictions": self.m_evictions,
+                "size": len(self.m_items),
+                "hit_rate": self.m_hits / total if total > 0 else 0.0,
+            }
+
+
+class WorkTask(QRunnable):
+    THREAD_BACKEND = "thread"
+    PROCESS_BACKEND = "process"
+    INTERACTIVE_PRIORITY = 10
+    NORMAL_PRIORITY = 0
+    BACKGROUND_PRIORITY = -10
+
+    def __init__(self, func, *args, **kwargs) -> None:
+        super().__init__()
+        self.setAutoDelete(False)
         self.m_func = func
         self.m_args = args
         self.m_kwargs = kwargs
+        self.m_backend = WorkTask.THREAD_BACKEND
+        self.m_reporter = None
+        self.m_reporterArg = None
+        self.m_cancelToken = CancelToken()
+        self.m_cancelTokenArg = None
+        self.m_timeout = 0
+        self.m_resultCache = None
+        self.m_priority = WorkTask.NORMAL_PRIORITY
+        self.m_coalesce = False
+        self.m_metrics = None
+        self.m_submitTime = 0.0
+        self.m_startTime = 0.0
+        self.m_finishTime = 0.0
+        self.m_pool = None
+        self.m_processFuture = None
+        self.m_lock = threading.Lock()
+        self.m_runStarted = False
+        self.m_runFinished = False
+        self.m_threadReleased = False
+        self.m_results = None
+        self.m_exception = None
+        self.m_future = LoadFuture(self.cancel)
+        self.m_signals = WorkSignals()
+        self.send_finish_sig = self.m_signals.send_finish_sig
+        self.send_finish_sig.connect(self._on_finish)
+        self.m_signals.send_progress_sig.connect(self._on_progress)
+
+    def set_backend(self, backend):
+        # process后端要求函数及参数可被pickle，适用于长时间占用GIL的计算任务
+        if backend not in (WorkTask.THREAD_BACKEND, WorkTask.PROCESS_BACKEND):
+            raise ValueError(f"不支持的执行后端:{backend}")
+        if backend == WorkTask.PROCESS_BACKEND and self.m_reporter is not None:
+            raise ValueError("process后端不支持进度回报")
+        if backend == WorkTask.PROCESS_BACKEND and self.m_cancelTokenArg is not None:
+            raise ValueError("process后端不支持取消标记")
+        self.m_backend = backend
+
+    def set_reporter_arg(self, arg_name, interval=50):
+        # 以关键字参数arg_name向函数传入ProgressReporter，仅支持线程后端
+        if self.m_backend == WorkTask.PROCESS_BACKEND:
+            raise ValueError("process后端不支持进度回报")
+        self.m_reporterArg = arg_name
+        self.m_reporter = ProgressReporter(self.m_signals.send_progress_sig, interval)
+
+    def set_cancel_token_arg(self, arg_name):
+        # 以关键字参数arg_name向函数传入CancelToken，仅支持线程后端
+        if self.m_backend == WorkTask.PROCESS_BACKEND:
+            raise ValueError("process后端不支持取消标记")
+        self.m_cancelTokenArg = arg_name
+
+    def set_timeout(self, timeout):
+        # 从提交开始计时，超时后按取消处理，单位毫秒，0表示不限时
+        self.m_timeout = timeout
+
+    def set_priority(self, priority):
+        # 数值越大越先执行，只影响排队中的任务
+        self.m_priority = priority
+
+    def set_coalesce(self, coalesce):
+        # 与同一提示下尚未完成的相同任务(函数及参数相同)合并为一次执行，结果分发给每个调用者
+        self.m_coalesce = coalesce
+
+    def set_result_cache(self, cache):
+        # 命中缓存时同步返回结果，不显示提示也不占用工作线程
+        self.m_resultCache = cache
+
+    def is_finished(self):
+        return self.m_results is not None
+
+    def future(self):
+        return self.m_future
+
+    def start_in_thread(self, pool):
+        # 向线程池提交的是绑定方法而不是任务本身：线程池会一直持有以QRunnable提交且不自动删除的对象，
+        # 任务及其参数、结果将无法释放
+        self.m_pool = pool
+        pool.start(self._run_in_pool, self.m_priority)
+
+    def _run_in_pool(self):
+        # 提高优先级时同一任务会再次进入队列，只执行最先开始的一次；已取消的任务不再执行
+        with self.m_lock:
+            if self.m_runStarted or self.m_results is not None:
+                return
+            self.m_runStarted = True
+        self.run()
+
+    def raise_priority(self, priority):
+        # 仍在线程池中排队时按新的优先级再次排队，原来的排队项开始时直接跳过
+        if priority <= self.m_priority:
+            return
+        self.m_priority = priority
+        with self.m_lock:
+            queued = not self.m_runStarted and self.m_results is None
+        if self.m_pool is not None and queued:
+            self.m_pool.start(self._run_in_pool, self.m_priority)
 
     def run(self):
+        result = None
+        exception = None
+        if self.m_metrics is not None:
+            self.m_startTime = time.perf_counter()
         try:
-            result = None
-            if self.m_func:
-                if len(self.m_args) > 0 and len(self.m_kwargs) > 0:
-                    result = self.m_func(*self.m_args, **self.m_kwargs)
-                elif len(self.m_args) > 0:
-                    result = self.m_func(*self.m_args)
-                elif len(self.m_kwargs) > 0:
-                    result = self.m_func(**self.m_kwargs)
-                else:
-                    result = self.m_func()
+            self.m_cancelToken.raise_if_cancelled()
+            kwargs = self.m_kwargs
+            if self.m_reporter is not None or self.m_cancelTokenArg is not None:
+                kwargs = dict(kwargs)
+                if self.m_reporter is not None:
+                    kwargs[self.m_reporterArg] = self.m_reporter
+                if self.m_cancelTokenArg is not None:
+                    kwargs[self.m_cancelTokenArg] = self.m_cancelToken
+            result = self.m_func(*self.m_args, **kwargs)
+        except TaskCancelledError as e:
+            exception = e
         except Exception as e:
+            exception = e
             print(f"load_widget线程函数执行出错:{e}")
         finally:
-            self.m_func = None
-            self.m_args = None
-            self.m_kwargs = None
-            self.send_finish_sig.emit([result])
+            with self.m_lock:
+                self.m_runFinished = True
+                thread_released = self.m_threadReleased
+            if thread_released and shiboken6.isValid(self.m_pool):
+                # 任务已被取消，收回取消时临时放开的线程名额
+                self.m_pool.reserveThread()
+            self._finish(result, exception)
 
+    def start_in_process(self, pool, threshold):
+        self.m_processFuture = pool.submit(_process_call, self.m_func, self.m_args, self.m_kwargs, threshold)
+        self.m_processFuture.add_done_callback(self._on_process_done)
 
-class LoadWidget(QWidget):
+    def _on_process_done(self, future):
+        # 在进程池的管理线程中回调，共享内存的拷贝不会占用GUI线程
+        result = None
+        exception = None
+        try:
+            result, run_time = future.result()
+            if self.m_metrics is not None:
+                # 子进程与主进程的计时起点不同，按子进程返回的执行耗时倒推开始时间，
+                # queue_wait因此包含排队、进程间传递参数和结果的时间
+                self.m_startTime = time.perf_counter() - run_time
+            result = _restore_result(result)
+        except concurrent.futures.CancelledError as e:
+            exception = e
+        except Exception as e:
+            exception = e
+            print(f"load_widget进程函数执行出错:{e}")
+        finally:
+            self._finish(result, exception)
+            # 子进程真正空闲后才通知，已取消但仍在执行的任务继续占用进程名额
+            self.m_signals.send_process_done_sig.emit()
+
+    def cancel(self, exception=None):
+        # 在GUI线程中调用，排队中的任务不再执行；执行中的任务通过取消标记通知函数，结果随即以异常结束
+        # process后端执行中的任务无法中止，子进程执行完毕前仍计入进程池的占用数
+        if exception is None:
+            exception = TaskCancelledError("任务已取消")
+        self.m_cancelToken.cancel()
+        with self.m_lock:
+            if self.m_results is not None:
+                return False
+            self.m_results = [None]
+            self.m_exception = exception
+        if self.m_metrics is not None:
+            self.m_metrics.record_exception(exception)
+        if self.m_processFuture is not None:
+            self.m_processFuture.cancel()
+        elif self.m_pool is not None:
+            # 排队中的任务开始时会直接跳过；执行中的函数无法被强制终止，临时放开一个线程名额，避免排队中的任务被卡住
+            with self.m_lock:
+                release_thread = self.m_runStarted and not self.m_runFinished
+                self.m_threadReleased = release_thread
+            if release_thread:
+                self.m_pool.releaseThread()
+        self.send_finish_sig.emit(self.m_results)
+        return True
+
+    def _finish(self, result, exception=None):
+        with self.m_lock:
+            if self.m_results is not None:
+                return False
+            self.m_results = [result]
+            self.m_exception = exception
+        if self.m_metrics is not None:
+            self._record_finish(exception)
+        self.send_finish_sig.emit(self.m_results)
+        return True
+
+    def _record_finish(self, exception):
+        self.m_finishTime = time.perf_counter()
+        if self.m_startTime > 0:
+            self.m_metrics.record("queue_wait", self.m_startTime - self.m_submitTime)
+            self.m_metrics.record("run_time", self.m_finishTime - self.m_startTime)
+        if exception is not None:
+            self.m_metrics.record_exception(exception)
+
+    def _on_progress(self):
+        self._deliver_progress()
+        self.m_reporter.arm_throttle(self._deliver_progress)
+
+    def _deliver_progress(self):
+        # 已取消的任务也要取走合并的更新，否则节流定时器会一直认为有待送出的进度
+        progress = self.m_reporter.take()
+        if not self.m_future.done():
+            self.m_future.report_progress(*progress)
+
+    def _on_finish(self, results):
+        # 先送出合并后尚未送达的进度，再完成future
+        if self.m_metrics is not None and self.m_finishTime > 0:
+            self.m_metrics.record("delivery_latency", time.perf_counter() - self.m_finishTime)
+        if self.m_reporter is not None and self.m_reporter.is_dirty():
+            self._deliver_progress()
+        self.m_future.set_result(results[0], self.m_exception)
+
+
+class AnimationClock(QObject):
+    # 所有可见的加载提示共用一个定时器，没有可见提示时定时器完全停止
     _instance = None
 
+    @staticmethod
+    def instance():
+        if AnimationClock._instance is None:
+            AnimationClock._instance = AnimationClock()
+        return AnimationClock._instance
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.m_widgets = set()
+        self.m_interval = 500
+        self.m_idleInterval = 1000
+        self.m_timer = QTimer(self)
+        self.m_timer.timeout.connect(self.on_tick)
+        QGuiApplication.instance().applicationStateChanged.connect(self.on_application_state_changed)
+
+    def set_interval(self, interval):
+        self.m_interval = interval
+        self._update_timer()
+
+    def set_idle_interval(self, interval):
+        # 程序不在前台时使用的动画间隔，0表示暂停动画
+        self.m_idleInterval = interval
+        self._update_timer()
+
+    def register(self, widget):
+        self.m_widgets.add(widget)
+        self._update_timer()
+
+    def unregister(self, widget):
+        self.m_widgets.discard(widget)
+        self._update_timer()
+
+    def on_application_state_changed(self, state):
+        self._update_timer()
+
+    def on_tick(self):
+        for widget in list(self.m_widgets):
+            try:
+                widget.on_update_widget()
+            except RuntimeError:
+                self.m_widgets.discard(widget)
+        if len(self.m_widgets) == 0:
+            self._update_timer()
+
+    def _update_timer(self):
+        if QGuiApplication.applicationState() == Qt.ApplicationState.ApplicationActive:
+            interval = self.m_interval
+        else:
+            interval = self.m_idleInterval
+        if len(self.m_widgets) == 0 or interval <= 0:
+            self.m_timer.stop()
+        elif not self.m_timer.isActive() or self.m_timer.interval() != interval:
+            self.m_timer.start(interval)
+
+
+class LoadWidget(QWidget):
+    _instances = dict()
+    _pooled_instances = []
+    _max_pooled_count = 2
+    _current_parent = None
+    _show_delay = 0
+    _min_show_time = 0
+    _visibility_statistics = {"shown_count": 0, "avoided_show_count": 0, "avoided_paint_count": 0}
+    _thread_pool = None
+    _max_worker_count = QThread.idealThreadCount()
+    _process_pool = None
+    _max_process_count = None
+    _shared_memory_threshold = 1024 * 1024
+    _process_queue = []
+    _process_sequence = itertools.count()
+    _process_in_flight = 0
+    _coalesced_tasks = dict()
+    _metrics = None
+    _badge_path = None
+    BADGE_LENGTH = 80
+    BADGE_RADIUS = 40
+
     @staticmethod
     def get_instance(parent=None, info=""):
-        if LoadWidget._instance is None:
-            LoadWidget._instance = LoadWidget(parent, info)
+        # 每个父窗口各自持有一个提示，parent为空时使用最近一次指定的父窗口或当前活动窗口
+        if parent is None:
+            parent = LoadWidget._current_parent
+            if parent is None or not shiboken6.isValid(parent):
+                parent = QApplication.activeWindow()
+        LoadWidget._current_parent = parent
+        instance = LoadWidget._instances.get(parent)
+        if instance is None:
+            if len(LoadWidget._pooled_instances) > 0:
+                instance = LoadWidget._pooled_instances.pop()
+                instance.setInfoText(info if len(info) > 0 else "加载中")
+                instance.setParent(parent)
+            else:
+                instance = LoadWidget(parent, info)
+        elif len(info) > 0:
+            instance.setInfoText(info)
+        return instance
+
+    @staticmethod
+    def find_instance(parent=None):
+        if parent is None:
+            parent = LoadWidget._current_parent
+        return LoadWidget._instances.get(parent)
+
+    @staticmethod
+    def set_max_pooled_count(count):
+        # 父窗口关闭后保留的空闲提示数量，超出的直接销毁
+        LoadWidget._max_pooled_count = count
+        while len(LoadWidget._pooled_instances) > count:
+            LoadWidget._pooled_instances.pop().close()
+
+    @staticmethod
+    def _release_instance(instance):
+        parent = instance.parent()
+        if LoadWidget._current_parent is parent:
+            LoadWidget._current_parent = None
+        instance.m_tasks.clear()
+        instance.m_showCount = 0
+        instance.m_delayTimer.stop()
+        instance.m_hideTimer.stop()
+        instance.hide()
+        if len(LoadWidget._pooled_instances) < LoadWidget._max_pooled_count:
+            LoadWidget._pooled_instances.append(instance)
+            instance.setParent(None)
         else:
-            if parent is not None:
-                LoadWidget._instance.setParent(parent)
-            if len(info) > 0:
-                LoadWidget._instance.setInfoText(info)
-        return LoadWidget._instance
+            instance.close()
+
+    @staticmethod
+    def _forget_instance(instance):
+        instance.m_tasks.clear()
+        for parent in [parent for parent, value in LoadWidget._instances.items() if value is instance]:
+            del LoadWidget._instances[parent]
+            if LoadWidget._current_parent is parent:
+                LoadWidget._current_parent = None
+        if instance in LoadWidget._pooled_instances:
+            LoadWidget._pooled_instances.remove(instance)
+
+    @staticmethod
+    def set_metrics(metrics):
+        # 传入LoadMetrics开始统计，传入None关闭
+        LoadWidget._metrics = metrics
+
+    @staticmethod
+    def metrics():
+        return LoadWidget._metrics
+
+    @staticmethod
+    def set_show_delay(delay, min_show_time=0):
+        # 任务执行超过delay毫秒才显示提示，显示后至少保持min_show_time毫秒，避免快速任务造成闪烁
+        LoadWidget._show_delay = delay
+        LoadWidget._min_show_time = min_show_time
+
+    @staticmethod
+    def visibility_statistics():
+        return dict(LoadWidget._visibility_statistics)
 
     @staticmethod
     def show_load_widget(parent=None, info=""):
-        if parent is None and LoadWidget._instance.parent() is None:
-            parent = QApplication.activeWindow()
-        LoadWidget.get_instance(parent, info).show()
+        LoadWidget.get_instance(parent, info).request_show()
 
     @staticmethod
     def start_exec_func(info, func, *args, **kwargs):
         return LoadWidget.get_instance(info=info).set_func(func, *args, **kwargs)
 
     @staticmethod
-    def hide_load_widget():
-        LoadWidget.get_instance().hide()
+    def start_exec_task(info, task):
+        return LoadWidget.get_instance(info=info).set_task(task)
+
+    @staticmethod
+    def start_exec_map(info, func, iterable, chunksize=1, backend=WorkTask.THREAD_BACKEND, max_in_flight=None):
+        return LoadWidget.get_instance(info=info).map_func(func, iterable, chunksize, backend, max_in_flight)
+
+    @staticmethod
+    def submit_func(info, func, *args, **kwargs):
+        # 立即返回LoadFuture，不进入嵌套事件循环
+        return LoadWidget.get_instance(info=info).submit(WorkTask(func, *args, **kwargs))
+
+    @staticmethod
+    def submit_task(info, task):
+        return LoadWidget.get_instance(info=info).submit(task)
+
+    @staticmethod
+    def hide_load_widget(parent=None):
+        instance = LoadWidget.find_instance(parent)
+        if instance is not None:
+            instance.release_show()
+
+    @staticmethod
+    def thread_pool():
+        if LoadWidget._thread_pool is None:
+            LoadWidget._thread_pool = QThreadPool()
+            LoadWidget._thread_pool.setMaxThreadCount(LoadWidget._max_worker_count)
+        return LoadWidget._thread_pool
+
+    @staticmethod
+    def set_max_worker_count(count):
+        # 同时执行的任务数，超出的任务在线程池中排队
+        LoadWidget._max_worker_count = max(1, count)
+        if LoadWidget._thread_pool is not None:
+            LoadWidget._thread_pool.setMaxThreadCount(LoadWidget._max_worker_count)
+
+    @staticmethod
+    def process_pool():
+        if LoadWidget._process_pool is None:
+            # 使用spawn启动子进程，避免fork带有Qt线程的GUI进程
+            LoadWidget._process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=LoadWidget._max_process_count, mp_context=multiprocessing.get_context("spawn"))
+        return LoadWidget._process_pool
+
+    @staticmethod
+    def set_process_backend(max_process_count=None, shared_memory_threshold=1024 * 1024):
+        # 超过shared_memory_threshold字节的numpy结果通过共享内存返回
+        LoadWidget._shared_memory_threshold = shared_memory_threshold
+        if max_process_count != LoadWidget._max_process_count and LoadWidget._process_pool is not None:
+            LoadWidget._process_pool.shutdown(wait=False)
+            LoadWidget._process_pool = None
+        LoadWidget._max_process_count = max_process_count
+
+    @staticmethod
+    def _queue_process_task(task):
+        # ProcessPoolExecutor按提交顺序执行，在此按优先级排队，只向进程池提交与进程数相同的任务
+        heapq.heappush(LoadWidget._process_queue, (-task.m_priority, next(LoadWidget._process_sequence), task))
+        LoadWidget._dispatch_process_tasks()
+
+    @staticmethod
+    def _dispatch_process_tasks():
+        max_count = LoadWidget._max_process_count or os.cpu_count() or 1
+        while LoadWidget._process_in_flight < max_count and len(LoadWidget._process_queue) > 0:
+            task = heapq.heappop(LoadWidget._process_queue)[2]
+            if task.is_finished() or task.m_processFuture is not None:
+                continue
+            LoadWidget._process_in_flight += 1
+            task.m_signals.send_process_done_sig.connect(LoadWidget._on_process_task_done)
+            task.start_in_process(LoadWidget.process_pool(), LoadWidget._shared_memory_threshold)
+
+    @staticmethod
+    def _on_process_task_done():
+        LoadWidget._process_in_flight -= 1
+        LoadWidget._dispatch_process_tasks()
+
+    @staticmethod
+    def set_persistent_workers(enable, prestart=True):
+        # 常驻工作线程：线程不再因空闲超时退出，可预先启动全部线程，短任务无需等待线程创建
+        pool = LoadWidget.thread_pool()
+        pool.setExpiryTimeout(-1 if enable else 30000)
+        if enable and prestart:
+            LoadWidget.prestart_workers()
+
+    @staticmethod
+    def prestart_workers(count=None):
+        pool = LoadWidget.thread_pool()
+        if count is None:
+            count = pool.maxThreadCount()
+        count = min(count, pool.maxThreadCount()) - pool.activeThreadCount()
+        if count <= 0:
+            return
+        # 每个占位任务都等待其余任务开始执行，迫使线程池创建count个不同的线程
+        barrier = threading.Barrier(count)
+
+        def wait_barrier():
+            try:
+                barrier.wait(1)
+            except threading.BrokenBarrierError:
+                pass
+
+        for _ in range(count):
+            pool.start(wait_barrier)
 
     def __init__(self, parent=None, info=""):
         super().__init__(parent)
@@ -78,118 +927,430 @@ class LoadWidget(QWidget):
             self.m_showText = "加载中"
         self.m_results = None
         self.m_count = 3
-        self.m_loop = QEventLoop(self)
-        self.m_workThread = WorkThread(self)
-        self.m_workThread.send_finish_sig.connect(self.recv_finish_sig)
-        self.m_timer = QTimer(self)
-        self.m_timer.setInterval(500)
-        self.m_timer.timeout.connect(self.on_update_widget)
+        self.m_tasks = set()
+        self.m_showCount = 0
+        self.m_progressText = None
+        self.m_delayTimer = QTimer(self)
+        self.m_delayTimer.setSingleShot(True)
+        self.m_delayTimer.timeout.connect(self.on_show_delay_timeout)
+        self.m_hideTimer = QTimer(self)
+        self.m_hideTimer.setSingleShot(True)
+        self.m_hideTimer.timeout.connect(self._update_visibility)
+        self.m_pendingElapsed = QElapsedTimer()
+        self.m_shownElapsed = QElapsedTimer()
+        self.m_parentResizePending = False
+        self.m_resizeTimer = QTimer(self)
+        self.m_resizeTimer.setSingleShot(True)
+        self.m_resizeTimer.setInterval(16)
+        self.m_resizeTimer.timeout.connect(self.on_parent_resize)
+        self.m_cancelButton = QPushButton("取消", self)
+        self.m_cancelButton.clicked.connect(self.cancel_all)
+        self.m_cancelButton.hide()
+        self._update_badge_rect()
+        self._update_badge_font()
+        self.destroyed.connect(functools.partial(LoadWidget._forget_instance, self))
         self.setParent(parent)
         self.hide()
 
     def eventFilter(self, watched: QObject, event: QEvent) -> bool:
-        if watched == self.parent() and event.type() == QEvent.Resize:
-            self.on_parent_resize(event)
-        if watched == self.parent() and event.type() == QEvent.Close:
-            self.close()
+        # 父窗口的所有事件都会经过这里，先比较事件类型
+        event_type = event.type()
+        if event_type == QEvent.Resize and watched == self.parent():
+            self._schedule_parent_resize()
+        elif event_type == QEvent.Close and watched == self.parent():
+            LoadWidget._release_instance(self)
         return super().eventFilter(watched, event)
 
     def paintEvent(self, event):
+        metrics = LoadWidget._metrics
+        if metrics is not None:
+            start_time = time.perf_counter()
         painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        painter.fillRect(self.rect(), QColor(5, 5, 5, 100))  # 设置整个窗口的背景颜色
+        # 动画帧只重绘提示框区域，整个窗口的背景只在显示或尺寸变化时绘制
+        painter.fillRect(event.rect(), QColor(5, 5, 5, 100))
+        if event.rect().intersects(self.m_badgeRect):
+            painter.drawPixmap(self.m_badgeRect.topLeft(), self._badge_pixmap(self._frame_text()))
+        painter.end()
+        if metrics is not None:
+            metrics.record("paint_time", time.perf_counter() - start_time)
 
-        centerPos = QPoint(self.width() / 2, self.height() / 2)
-        painterPath = QPainterPath()
-        rect_length = 80
-        rect_radius = 40
-        painter.setBrush(QColor(50, 50, 50))
-        painter.setPen(QColor(50, 50, 50))
-        painterPath.moveTo(centerPos.x() - rect_length / 2, centerPos.y() - rect_length / 2 - rect_radius)
-        painterPath.lineTo(centerPos.x() + rect_length / 2, centerPos.y() - rect_length / 2 - rect_radius)
-        painterPath.arcTo(centerPos.x() + rect_length / 2 - rect_radius,
-                          centerPos.y() - rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, 90, -90)
-        painterPath.lineTo(centerPos.x() + rect_length / 2 + rect_radius, centerPos.y() + rect_length / 2)
-        painterPath.arcTo(centerPos.x() + rect_length / 2 - rect_radius,
-                          centerPos.y() + rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, 0, -90)
-        painterPath.lineTo(centerPos.x() - rect_length / 2, centerPos.y() + rect_length / 2 + rect_radius)
-        painterPath.arcTo(centerPos.x() - rect_length / 2 - rect_radius,
-                          centerPos.y() + rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, -90, -90)
-        painterPath.lineTo(centerPos.x() - rect_length / 2 - rect_radius, centerPos.y() - rect_length / 2)
-        painterPath.arcTo(centerPos.x() - rect_length / 2 - rect_radius,
-                          centerPos.y() - rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, -180, -90)
-        painter.drawPath(painterPath)
+    @staticmethod
+    def badge_path():
+        # 圆角矩形只与尺寸有关，以提示框左上角为原点构建一次
+        if LoadWidget._badge_path is None:
+            rect_length = LoadWidget.BADGE_LENGTH
+            rect_radius = LoadWidget.BADGE_RADIUS
+            centerPos = QPoint(rect_length / 2 + rect_radius, rect_length / 2 + rect_radius)
+            painterPath = QPainterPath()
+            painterPath.moveTo(centerPos.x() - rect_length / 2, centerPos.y() - rect_length / 2 - rect_radius)
+            painterPath.lineTo(centerPos.x() + rect_length / 2, centerPos.y() - rect_length / 2 - rect_radius)
+            painterPath.arcTo(centerPos.x() + rect_length / 2 - rect_radius,
+                              centerPos.y() - rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, 90, -90)
+            painterPath.lineTo(centerPos.x() + rect_length / 2 + rect_radius, centerPos.y() + rect_length / 2)
+            painterPath.arcTo(centerPos.x() + rect_length / 2 - rect_radius,
+                              centerPos.y() + rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, 0, -90)
+            painterPath.lineTo(centerPos.x() - rect_length / 2, centerPos.y() + rect_length / 2 + rect_radius)
+            painterPath.arcTo(centerPos.x() - rect_length / 2 - rect_radius,
+                              centerPos.y() + rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, -90, -90)
+            painterPath.lineTo(centerPos.x() - rect_length / 2 - rect_radius, centerPos.y() - rect_length / 2)
+            painterPath.arcTo(centerPos.x() - rect_length / 2 - rect_radius,
+                              centerPos.y() - rect_length / 2 - rect_radius, rect_radius * 2, rect_radius * 2, -180,
+                              -90)
+            LoadWidget._badge_path = painterPath
+        return LoadWidget._badge_path
 
-        painter.setPen(QColor(255, 255, 255))
-        font = painter.font()
-        font.setPointSize(14)
-        painter.setFont(font)
+    def _update_badge_font(self):
+        self.m_badgeFont = QFont(self.font())
+        self.m_badgeFont.setPointSize(14)
+        self.m_badgeFontKey = self.m_badgeFont.key()
 
-        text_size = QSize(rect_length, rect_length)
+    def _text_rect(self):
+        return QRect(LoadWidget.BADGE_RADIUS, LoadWidget.BADGE_RADIUS, LoadWidget.BADGE_LENGTH,
+                     LoadWidget.BADGE_LENGTH)
 
-        showText = f"{self.m_showText}\n{'.'*self.m_count}"
+    def _frame_text(self):
+        if self.m_progressText is not None:
+            return f"{self.m_showText}\n{self.m_progressText}"
+        return f"{self.m_showText}\n{'.'*self.m_count}"
 
-        painter.drawText(
-            QRect(centerPos.x() - text_size.width() / 2,
-                  centerPos.y() - text_size.height() / 2, text_size.width(), text_size.height()), Qt.AlignCenter,
-            showText)
+    def _update_badge_rect(self):
+        size = LoadWidget.BADGE_LENGTH + LoadWidget.BADGE_RADIUS * 2
+        self.m_badgeRect = QRect(self.width() // 2 - size // 2, self.height() // 2 - size // 2, size, size)
+        # 取消按钮位于提示框底部文字下方
+        self.m_cancelButton.setGeometry(self.m_badgeRect.x() + LoadWidget.BADGE_RADIUS + 8,
+                                        self.m_badgeRect.bottom() - LoadWidget.BADGE_RADIUS + 6,
+                                        LoadWidget.BADGE_LENGTH - 16, 26)
+
+    def set_cancel_button_visible(self, visible):
+        self.m_cancelButton.setVisible(visible)
+
+    def _badge_pixmap(self, text):
+        # 每一帧预先渲染并缓存在QPixmapCache中，文字或屏幕缩放变化时才重新生成
+        dpr = self.devicePixelRatioF()
+        key = f"LoadWidget|{dpr}|{self.m_badgeFontKey}|{text}"
+        pixmap = QPixmapCache.find(key)
+        if pixmap is not None:
+            return pixmap
+        pixmap = QPixmap(self.m_badgeRect.size() * dpr)
+        pixmap.setDevicePixelRatio(dpr)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setBrush(QColor(50, 50, 50))
+        painter.setPen(QColor(50, 50, 50))
+        painter.drawPath(LoadWidget.badge_path())
+        painter.setPen(QColor(255, 255, 255))
+        painter.setFont(self.m_badgeFont)
+        painter.drawText(self._text_rect(), Qt.AlignCenter, text)
+        painter.end()
+        QPixmapCache.insert(key, pixmap)
+        return pixmap
 
     def showEvent(self, event: QShowEvent) -> None:
-        self.m_timer.start()
+        if self.m_parentResizePending:
+            self.on_parent_resize()
+        AnimationClock.instance().register(self)
         self.m_count = 3
         return super().showEvent(event)
 
     def hideEvent(self, event: QHideEvent) -> None:
-        self.m_timer.stop()
+        AnimationClock.instance().unregister(self)
+        self.m_progressText = None
         return super().hideEvent(event)
 
     def resizeEvent(self, event: QResizeEvent) -> None:
+        self._update_badge_rect()
         self.update()
         return super().resizeEvent(event)
 
+    def changeEvent(self, event: QEvent) -> None:
+        if event.type() == QEvent.FontChange:
+            self._update_badge_font()
+        return super().changeEvent(event)
+
     def closeEvent(self, event: QCloseEvent) -> None:
-        self.m_timer.stop()
+        AnimationClock.instance().unregister(self)
         return super().closeEvent(event)
 
     def set_func(self, func, *args, **kwargs):
-        if self.m_workThread.isRunning():
-            self.hide()
-            return None
+        return self.set_task(WorkTask(func, *args, **kwargs))
+
+    def set_task(self, task):
+        metrics = LoadWidget._metrics
+        if metrics is not None:
+            start_time = time.perf_counter()
+        future = self.submit(task)
+        if not future.done():
+            loop = QEventLoop()
+            future.add_done_callback(lambda future: loop.quit())
+            loop.exec()
+        if metrics is not None:
+            metrics.record("caller_wait", time.perf_counter() - start_time)
+        return future.m_result
+
+    def submit(self, task):
+        if task.is_finished():
+            return task.future()
+        if LoadWidget._metrics is not None:
+            task.m_metrics = LoadWidget._metrics
+            task.m_submitTime = time.perf_counter()
+        if task.m_resultCache is not None:
+            key = ResultCache.make_key(task.m_func, task.m_args, task.m_kwargs)
+            if key is not None:
+                found, result = task.m_resultCache.get(key)
+                if found:
+                    task._finish(result)
+                    return task.future()
+                task.future().add_done_callback(functools.partial(self._store_result, task.m_resultCache, key))
+        self.m_tasks.add(task)
+        # 作为第一个完成回调，在等待结果的调用者被唤醒之前完成提示的隐藏和统计；
+        # 不连接到send_finish_sig，否则信号连接持有的partial会使任务无法被回收
+        task.future().add_done_callback(lambda future: self.recv_finish_sig(task, [future.m_result]))
+        if task.m_reporter is not None:
+            task.future().add_progress_callback(functools.partial(self.recv_progress, task))
+        self._update_visibility()
+        if task.m_timeout > 0:
+            QTimer.singleShot(task.m_timeout,
+                              functools.partial(task.cancel, TaskTimeoutError(f"任务执行超过{task.m_timeout}ms")))
+        if task.m_coalesce and self._coalesce_task(task):
+            return task.future()
+        LoadWidget._start_task(task)
+        return task.future()
+
+    @staticmethod
+    def _start_task(task):
+        if task.m_backend == WorkTask.PROCESS_BACKEND:
+            LoadWidget._queue_process_task(task)
         else:
-            self.m_workThread.set_func(func, *args, **kwargs)
-            self.m_workThread.start()
-            self.show()
-            self.m_loop.exec()
-            self.m_workThread.quit()
-            self.m_workThread.wait()
-            return self.m_results[0]
-
-    def recv_finish_sig(self, results):
+            task.start_in_thread(LoadWidget.thread_pool())
+
+    def map_func(self, func, iterable, chunksize=1, backend=WorkTask.THREAD_BACKEND, max_in_flight=None):
+        # 按chunksize分块提交，按输入顺序逐个产出结果；同时在途的块数受max_in_flight限制，
+        # 输入与结果都不会一次性全部载入内存。提前停止迭代时会取消剩余的块
+        if max_in_flight is None:
+            if backend == WorkTask.PROCESS_BACKEND:
+                max_in_flight = (LoadWidget._max_process_count or os.cpu_count() or 1) * 2
+            else:
+                max_in_flight = LoadWidget.thread_pool().maxThreadCount() * 2
+        total = len(iterable) if hasattr(iterable, "__len__") else None
+
+        def generate():
+            items = iter(iterable)
+            pending = collections.deque()
+            finished_count = 0
+            self.request_show()
+            try:
+                while True:
+                    while len(pending) < max_in_flight:
+                        chunk = list(itertools.islice(items, chunksize))
+                        if len(chunk) == 0:
+                            break
+                        task = WorkTask(_map_chunk, func, chunk)
+                        task.set_backend(backend)
+                        self.submit(task)
+                        pending.append(task)
+                    if len(pending) == 0:
+                        break
+                    task = pending.popleft()
+                    results = collections.deque(task.future().result())
+                    # 结果只由这里逐个交给调用者，任务和future不再持有，调用者用完的结果可以立即释放
+                    task.m_results = [None]
+                    task.future().m_result = None
+                    task = None
+                    finished_count += len(results)
+                    if total:
+                        self.show_progress(finished_count * 100 / total)
+                    else:
+                        self.show_progress(text=f"{finished_count}")
+                    while len(results) > 0:
+                        yield results.popleft()
+            finally:
+                for task in pending:
+                    task.future().cancel()
+                self.clear_progress()
+                self.release_show()
+
+        return generate()
+
+    def _coalesce_task(self, task):
+        # 同一提示下相同的任务(函数及参数相同)合并为一次共享执行，调用者各自等待其结果；
+        # 某个调用者取消或超时只会脱离共享执行，所有调用者都脱离后才取消共享执行。返回False表示task需要正常执行
+        key = ResultCache.make_key(task.m_func, task.m_args, task.m_kwargs)
+        if key is None:
+            return False
+        key = (self, task.m_backend, key)
+        shared = LoadWidget._coalesced_tasks.get(key)
+        if shared is None or shared[0].is_finished():
+            shared_task = WorkTask(task.m_func, *task.m_args, **task.m_kwargs)
+            shared_task.set_backend(task.m_backend)
+            shared_task.set_priority(task.m_priority)
+            if task.m_reporter is not None:
+                shared_task.set_reporter_arg(task.m_reporterArg, task.m_reporter.m_interval)
+            if task.m_cancelTokenArg is not None:
+                shared_task.set_cancel_token_arg(task.m_cancelTokenArg)
+            # 耗时和异常只按共享执行统计一次
+            shared_task.m_metrics = task.m_metrics
+            shared_task.m_submitTime = task.m_submitTime
+            shared = (shared_task, set())
+            LoadWidget._coalesced_tasks[key] = shared
+            shared_task.future().add_done_callback(functools.partial(LoadWidget._forget_coalesced_task, key, shared_task))
+            shared_task.future().add_progress_callback(functools.partial(LoadWidget._forward_coalesced_progress, shared[1]))
+            LoadWidget._start_task(shared_task)
+        else:
+            shared_task = shared[0]
+            if task.m_backend == WorkTask.PROCESS_BACKEND:
+                if task.m_priority > shared_task.m_priority and shared_task.m_processFuture is None:
+                    shared_task.m_priority = task.m_priority
+                    LoadWidget._queue_process_task(shared_task)
+            else:
+                shared_task.raise_priority(task.m_priority)
+        followers = shared[1]
+        followers.add(task)
+        task.m_metrics = None
+        shared_task.future().add_done_callback(lambda future: task._finish(future.m_result, future.m_exception))
+        task.future().add_done_callback(functools.partial(LoadWidget._detach_coalesced_task, shared_task, followers, task))
+        return True
+
+    @staticmethod
+    def _detach_coalesced_task(shared_task, followers, task, future):
+        followers.discard(task)
+        if len(followers) == 0 and not shared_task.is_finished():
+            shared_task.cancel()
+
+    @staticmethod
+    def _forward_coalesced_progress(followers, value, text, partials):
+        for task in list(followers):
+            task.future().report_progress(value, text, partials)
+
+    @staticmethod
+    def _forget_coalesced_task(key, shared_task, future):
+        shared = LoadWidget._coalesced_tasks.get(key)
+        if shared is not None and shared[0] is shared_task:
+            del LoadWidget._coalesced_tasks[key]
+
+    @staticmethod
+    def _store_result(cache, key, future):
+        if future.exception() is None:
+            cache.put(key, future.m_result)
+
+    def cancel_all(self):
+        for task in list(self.m_tasks):
+            task.cancel()
+
+    def recv_finish_sig(self, task, results):
+        # 所有任务都结束后才隐藏，提示已被回收或销毁时不再处理
+        if task not in self.m_tasks:
+            return
         self.m_results = results
-        self.m_loop.quit()
-        self.hide()
+        self.m_tasks.discard(task)
+        self._update_visibility()
+
+    def recv_progress(self, task, value, text, partials):
+        if task in self.m_tasks:
+            self.show_progress(value, text)
+
+    def show_progress(self, value=None, text=None):
+        # 有进度时用百分比或文字代替省略号动画
+        if text is not None:
+            progress_text = text
+        elif value is not None:
+            progress_text = f"{value:.0f}%"
+        else:
+            return
+        if progress_text != self.m_progressText:
+            self.m_progressText = progress_text
+            self.update(self.m_badgeRect)
+
+    def clear_progress(self):
+        if self.m_progressText is not None:
+            self.m_progressText = None
+            self.update(self.m_badgeRect)
+
+    def request_show(self):
+        self.m_showCount += 1
+        self._update_visibility()
+
+    def release_show(self):
+        self.m_showCount = max(0, self.m_showCount - 1)
+        self._update_visibility()
+
+    def _update_visibility(self):
+        statistics = LoadWidget._visibility_statistics
+        if self.m_showCount > 0 or len(self.m_tasks) > 0:
+            self.m_hideTimer.stop()
+            if self.isVisible():
+                return
+            if self.m_showCount > 0 or LoadWidget._show_delay <= 0:
+                self.m_delayTimer.stop()
+                self._show_now()
+            elif not self.m_delayTimer.isActive():
+                self.m_pendingElapsed.start()
+                self.m_delayTimer.start(LoadWidget._show_delay)
+        elif self.m_delayTimer.isActive():
+            # 任务在延迟时间内完成，省去了显示、整窗绘制、动画帧和隐藏
+            self.m_delayTimer.stop()
+            statistics["avoided_show_count"] += 1
+            interval = AnimationClock.instance().m_interval
+            statistics["avoided_paint_count"] += 1 + self.m_pendingElapsed.elapsed() // interval
+        elif self.isVisible():
+            remaining = LoadWidget._min_show_time - self.m_shownElapsed.elapsed()
+            if remaining > 0:
+                if not self.m_hideTimer.isActive():
+                    self.m_hideTimer.start(remaining)
+            else:
+                self.hide()
+
+    def on_show_delay_timeout(self):
+        if self.m_showCount > 0 or len(self.m_tasks) > 0:
+            self._show_now()
+
+    def _show_now(self):
+        LoadWidget._visibility_statistics["shown_count"] += 1
+        self.m_shownElapsed.start()
+        self.show()
 
     def setInfoText(self, info):
+        if info == self.m_showText:
+            return
         self.m_showText = info
+        self.update(self.m_badgeRect)
 
     def on_update_widget(self):
+        if self.m_progressText is not None:
+            return
         if self.m_count >= 3:
             self.m_count = 0
         else:
             self.m_count += 1
-        self.update()
+        self.update(self.m_badgeRect)
 
     def setParent(self, parent):
-        if self.parent() is not None:
-            self.removeEventFilter(self.parent())
+        old_parent = self.parent()
+        if old_parent is not None:
+            old_parent.removeEventFilter(self)
+        if LoadWidget._instances.get(old_parent) is self:
+            del LoadWidget._instances[old_parent]
         super().setParent(parent)
+        # 回收池中的空闲提示不登记
+        if self not in LoadWidget._pooled_instances:
+            LoadWidget._instances.setdefault(parent, self)
         if parent:
             parent.installEventFilter(self)
-            self.on_parent_resize()
+            self._schedule_parent_resize()
+
+    def _schedule_parent_resize(self):
+        # 拖动窗口时父窗口会连续改变大小，隐藏时只做标记，显示时每帧(16ms)最多跟随一次
+        self.m_parentResizePending = True
+        if self.isVisible() and not self.m_resizeTimer.isActive():
+            self.m_resizeTimer.start()
 
     def on_parent_resize(self, event=None):
         # 当父级窗口大小变化时调用此方法
-        self.resize(self.parent().geometry().width(), self.parent().geometry().height())
+        self.m_parentResizePending = False
+        self.m_resizeTimer.stop()
+        parent = self.parent()
+        if parent is not None:
+            self.resize(parent.width(), parent.height())
 
 
 class mainWindow(QWidget):
@@ -207,7 +1368,11 @@ class mainWindow(QWidget):
     def on_clicked(self):
         # LoadWidget.show_load_widget(self)
         LoadWidget.get_instance(self)
-        LoadWidget.start_exec_func('执行中', self.test_func, 3)
+        # 连续点击时合并为一次执行
+        task = WorkTask(self.test_func, 3)
+        task.set_coalesce(True)
+        task.set_priority(WorkTask.INTERACTIVE_PRIORITY)
+        LoadWidget.submit_task('执行中', task)
 
     def test_func(self, cnt):
         cnt = cnt
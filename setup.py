@@ -7,14 +7,268 @@ import os
 import shutil
 import platform
 # from distutils.core import setup
-from setuptools import setup
+from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 from Cython.Build import cythonize
+from Cython.Build.Dependencies import create_dependency_tree
 import subprocess
 import glob
 import concurrent.futures
 import fnmatch
 from datetime import datetime
 import pathlib
+import sys
+import json
+import hashlib
+import sysconfig
+import threading
+import math
+import re
+import time
+import fcntl
+import tarfile
+import stat
+import ast
+import collections
+import itertools
+import contextlib
+import multiprocessing
+import Cython
+
+FICLONE = 0x40049409
+
+# 合并模块的引导代码，与各模块一起编译进同一个.so，导入后由查找器从该.so中加载各子模块
+# 只使用启动时已加载的importlib.machinery，importlib.util会额外导入contextlib等模块，使启动变慢
+BUNDLE_BOOTSTRAP = '''import sys
+from importlib.machinery import ExtensionFileLoader, ModuleSpec
+
+_MODULE_NAMES = frozenset({moduleNames!r})
+
+
+class BundleFinder:
+
+    @classmethod
+    def find_spec(cls, fullname, path=None, target=None):
+        if fullname in _MODULE_NAMES:
+            spec = ModuleSpec(fullname, ExtensionFileLoader(fullname, __file__), origin=__file__)
+            spec.has_location = True
+            return spec
+        return None
+
+
+sys.meta_path.insert(0, BundleFinder)
+'''
+
+
+class FileInfo:
+
+    def __init__(self, path, size=0, mtime=0.0) -> None:
+        self.m_path = path
+        self.m_size = size
+        self.m_mtime = mtime
+        self.m_hash = None
+
+    def hash(self):
+        # 第一次使用时才计算文件内容的sha256，之后复用
+        if self.m_hash is None:
+            digest = hashlib.sha256()
+            with open(self.m_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            self.m_hash = digest.hexdigest()
+        return self.m_hash
+
+
+class _HashingReader:
+    # 写入tar的同时计算文件内容的sha256，生成清单时不需要再读取一次
+
+    def __init__(self, file) -> None:
+        self.m_file = file
+        self.m_digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.m_file.read(size)
+        self.m_digest.update(data)
+        return data
+
+
+def _getTraceEvent(name, category, start):
+    # 使用单调时钟，不受系统时间调整影响；Linux上各进程的perf_counter基于同一个CLOCK_MONOTONIC，编译进程的事件可以直接合并
+    return {
+        "name": name,
+        "category": category,
+        "start": start,
+        "duration": time.perf_counter() - start,
+        "pid": os.getpid(),
+        "tid": threading.get_native_id(),
+    }
+
+
+class BuildTracer:
+
+    def __init__(self) -> None:
+        self.m_lock = threading.Lock()
+        self.m_events = []
+        self.m_start_time = time.perf_counter()
+
+    def reset(self):
+        with self.m_lock:
+            self.m_events = []
+            self.m_start_time = time.perf_counter()
+
+    def addEvent(self, event):
+        with self.m_lock:
+            self.m_events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, category="phase"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addEvent(_getTraceEvent(name, category, start))
+
+    def getEvents(self, category):
+        with self.m_lock:
+            return [event for event in self.m_events if event["category"] == category]
+
+    def exportChromeTrace(self, path, otherData=None):
+        # Chrome trace格式，可在chrome://tracing或Perfetto中查看，每个编译进程单独一行
+        traceEvents = []
+        with self.m_lock:
+            events = list(self.m_events)
+        for pid in sorted(set(event["pid"] for event in events)):
+            name = "Setup" if pid == os.getpid() else f"worker {pid}"
+            traceEvents.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}})
+        for event in events:
+            traceEvent = {
+                "name": event["name"],
+                "cat": event["category"],
+                "ph": "X",
+                "ts": (event["start"] - self.m_start_time) * 1e6,
+                "dur": event["duration"] * 1e6,
+                "pid": event["pid"],
+                "tid": event["tid"],
+            }
+            if "args" in event:
+                traceEvent["args"] = event["args"]
+            traceEvents.append(traceEvent)
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms", "otherData": otherData or {}}, f,
+                      ensure_ascii=False)
+
+
+class _TimedBuildExt(build_ext):
+    # 记录每个扩展模块C编译及链接的耗时
+
+    def initialize_options(self):
+        super().initialize_options()
+        self.m_events = []
+
+    def build_extension(self, ext):
+        start = time.perf_counter()
+        super().build_extension(ext)
+        self.m_events.append(_getTraceEvent(ext.name, "compile", start))
+
+
+class _ParallelBuildExt(_TimedBuildExt):
+    # 一个扩展模块包含多个C文件时distutils逐个编译，这里改为多线程同时调用编译器
+
+    def build_extension(self, ext):
+        compile_func = self.compiler.compile
+
+        def parallel_compile(sources, **kwargs):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel or 1) as executor:
+                return list(executor.map(lambda source: compile_func([source], **kwargs)[0], sources))
+
+        self.compiler.compile = parallel_compile
+        try:
+            super().build_extension(ext)
+        finally:
+            self.compiler.compile = compile_func
+
+
+def _transpileFile(filePath, buildDirPath, compilerDirectives):
+    start = time.perf_counter()
+    extensions = cythonize(
+        filePath,
+        build_dir=buildDirPath,
+        compiler_directives=compilerDirectives,
+    )
+    sources = [x for extension in extensions for x in extension.sources]
+    return sources, _getTraceEvent(extensions[0].name, "transpile", start)
+
+
+def _compileBundle(filePathList, bundleName, packPath, buildDirPath, compilerDirectives, workerCount):
+    # 全部模块的C文件链接为一个扩展模块，每个模块的PyInit_<模块名>都保留在其中；各模块分别转换为C文件，记录每个模块的转换耗时
+    batchStart = time.perf_counter()
+    events = []
+    try:
+        sources = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workerCount) as executor:
+            for fileSources, event in executor.map(_transpileFile, filePathList, itertools.repeat(buildDirPath),
+                                                   itertools.repeat(compilerDirectives)):
+                sources.extend(fileSources)
+                events.append(event)
+        distribution = setup(
+            ext_modules=[Extension(bundleName, sources)],
+            cmdclass={"build_ext": _ParallelBuildExt},
+            script_args=[
+                "build_ext",
+                "-b",
+                packPath,
+                "-t",
+                buildDirPath,
+                "-j",
+                str(workerCount),
+            ],
+        )
+        events.extend(distribution.get_command_obj("build_ext").m_events)
+    except (Exception, SystemExit) as e:
+        raise Exception(f"合并编译{bundleName}出错: {e}")
+    events.append(_getTraceEvent(bundleName, "batch", batchStart))
+    return events
+
+
+def _compileBatch(filePathList, packPath, buildDirPath, compilerDirectives):
+    # 在独立的进程中运行，每个批次使用独立的临时目录，避免setuptools全局状态及buildExec目录被多个任务共享
+    batchStart = time.perf_counter()
+    events = []
+    try:
+        extensions = []
+        for filePath in filePathList:
+            start = time.perf_counter()
+            fileExtensions = cythonize(
+                filePath,
+                build_dir=buildDirPath,
+                compiler_directives=compilerDirectives,
+            )
+            extensions.extend(fileExtensions)
+            events.append(_getTraceEvent(fileExtensions[0].name, "transpile", start))
+        distribution = setup(
+            ext_modules=extensions,
+            cmdclass={"build_ext": _TimedBuildExt},
+            script_args=[
+                "build_ext",
+                "-b",
+                packPath,
+                "-t",
+                buildDirPath,
+                "-j",
+                "1",
+            ],
+        )
+        events.extend(distribution.get_command_obj("build_ext").m_events)
+    except (Exception, SystemExit) as e:
+        # setup()编译失败时抛出SystemExit，转换为普通异常返回给主进程
+        raise Exception(f"编译{','.join(filePathList)}文件出错: {e}")
+    finally:
+        for filePath in filePathList:
+            c_file = os.path.splitext(filePath)[0] + ".c"
+            if os.path.exists(c_file):
+                os.remove(c_file)
+    events.append(_getTraceEvent(f'batch of {len(filePathList)}', "batch", batchStart))
+    return events
 
 
 class Setup:
@@ -39,21 +293,68 @@ class Setup:
         self.m_package_dir = "pacakageExec"
         self.m_build_dir = "buildExec"
         self.m_user = 'rvbust'
+        self.m_compiler_directives = {"language_level": "3"}
+        # process: 多进程分批编译; thread: 旧版每个文件在线程中单独调用setup()
+        self.m_compile_engine = "process"
+        self.m_compile_worker_count = 0
+        self.m_compile_batch_size = 8
+        # 合并编译：程序根目录下可直接导入的模块编译为一个.so，减少启动时dlopen及扩展模块初始化的次数，仅process编译方式支持
+        self.m_bundle_enable = False
+        self.m_bundle_name = "_app_bundle"
+        # 各阶段的并发上限：复制为IO操作，编译占满CPU核心，外部加密工具单独限制，避免互相抢占
+        self.m_copy_worker_count = 8
+        self.m_encrypt_worker_count = 2
+        # 自定义加密命令，{input}和{output}会被替换为输入输出文件路径，为空时使用encrypt_dir_path下的SentinelTool
+        self.m_encrypt_command = []
+        # stream: 直接从源文件流式写出deb，未编译的文件不再复制; dpkg: 硬链接/reflink暂存后调用dpkg-deb
+        self.m_deb_writer = "stream"
+        # 压缩方式: xz, zstd, gz, none；xz和zstd优先使用外部多线程压缩程序
+        self.m_deb_compressor = "xz"
+        # 上一版本生成的清单文件，设置后额外生成只包含新增、修改及删除文件的增量包
+        self.m_delta_base_manifest_path = ''
+        # 编译缓存目录在多次打包之间保留，源码、.pxd等依赖及编译环境未变化的模块直接复用上次的.so
+        self.m_build_cache_enable = True
+        self.m_build_cache_dir = ".buildCache"
+        self.m_build_cache_max_count = 4096
+        # 设置后将各阶段及每个模块的编译耗时导出为Chrome trace格式的JSON文件
+        self.m_trace_path = ''
+        self.m_trace_top_count = 10
 
         self._init()
 
     def _init(self):
         self.m_all_path_dict = dict()
+        self.m_file_info_dict = dict()
+        self.m_pattern_matcher_dict = dict()
         self.m_current_dir_path = os.path.dirname(__file__)
         self.m_exclude_pack_patterns.append(os.path.basename(__file__))
+        self.m_exclude_pack_patterns.append(self.m_build_cache_dir)
+        self.m_exclude_pack_patterns.append("*.manifest.json")
+        self.m_exclude_pack_patterns.append("*.trace.json")
         self.m_current_time = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
 
         self.m_user_dir_path = f'/home/{self.m_user}'
         self.m_package_dir_path = os.path.join(self.m_current_dir_path, self.m_package_dir)
         self.m_build_dir_path = os.path.join(self.m_current_dir_path, self.m_build_dir)
+        self.m_build_cache_dir_path = os.path.join(self.m_current_dir_path, self.m_build_cache_dir)
+        self.m_ext_suffix = sysconfig.get_config_var('EXT_SUFFIX')
+        self.m_build_cache_lock = threading.Lock()
+        self.m_build_cache_hit_count = 0
+        self.m_build_cache_miss_count = 0
+        self.m_encrypt_lock = threading.Lock()
+        self.m_encrypt_executor = None
+        self.m_encrypt_command_list = []
+        self.m_encrypt_file_dict = dict()
+        self.m_encrypt_futures = []
+        self.m_stream_file_dict = dict()
+        self.m_manifest = dict()
+        self.m_manifest_source_dict = dict()
+        self.m_tracer = BuildTracer()
         self.m_deb_file_path = f'{self.m_current_dir_path}/{self.m_software_name}_{self.m_software_version}_{datetime.now().strftime("%Y%m%d")}_{platform.machine()}.deb'
 
         self.m_actual_install_dir_path = os.path.join('/', os.path.join(self.m_install_dir, self.m_software_name))
+        self.m_actual_patch_dir_path = f'{self.m_actual_install_dir_path}_patch'
+        self.m_patch_version_file_path = os.path.join(self.m_actual_install_dir_path, '.patch_version')
         self.m_pack_install_dir_path = os.path.join(
             self.m_current_dir_path,
             os.path.join(self.m_package_dir, os.path.join(self.m_install_dir, self.m_software_name)))
@@ -138,6 +439,7 @@ echo "before installing..."
 
         script_content = f"""#!/bin/sh
 echo "after installing..."
+rm -f {self.m_patch_version_file_path}
 {self._mvDataDir(True)}
 echo "create dataPath link"
 {self._handleDataDirLink(True)}
@@ -233,34 +535,150 @@ fi
 
     def _packExec(self):
         try:
-            self._run_command(["dpkg-deb", "--build", self.m_package_dir_path, self.m_deb_file_path])
+            self._buildDeb(self.m_package_dir_path, self.m_deb_file_path, self.m_stream_file_dict)
         except Exception as e:
             raise Exception(f"生成deb文件出错: {e}")
         else:
             print("生成deb文件成功")
 
+    def _buildDeb(self, packageDirPath, debFilePath, streamFileDict):
+        if self.m_deb_writer == "dpkg":
+            compressor = {"gz": "gzip", "xz": "xz", "zstd": "zstd", "none": "none"}[self.m_deb_compressor]
+            self._run_command(["dpkg-deb", f"-Z{compressor}", "--build", packageDirPath, debFilePath])
+        else:
+            self._writeDebFile(packageDirPath, debFilePath, streamFileDict)
+
+    def _writeDebFile(self, packageDirPath, debFilePath, streamFileDict):
+        # deb文件是ar归档：debian-binary、control.tar、data.tar，每个成员先写占位头部，写完数据后回填大小
+        suffix = {"gz": ".gz", "xz": ".xz", "zstd": ".zst", "none": ""}[self.m_deb_compressor]
+        debianDirPath = os.path.join(packageDirPath, "DEBIAN")
+        tmpPath = debFilePath + '.tmp'
+        try:
+            with open(tmpPath, 'wb') as f:
+                f.write(b'!<arch>\n')
+                self._writeArMember(f, 'debian-binary', lambda x: x.write(b'2.0\n'))
+                self._writeArMember(f, 'control.tar.gz',
+                                    lambda x: self._writeTar(x, self._getControlEntries(debianDirPath), "gz"))
+                dataEntries = self._getDataEntries(packageDirPath, streamFileDict)
+                self._writeArMember(f, f'data.tar{suffix}',
+                                    lambda x: self._writeTar(x, dataEntries, self.m_deb_compressor))
+            os.replace(tmpPath, debFilePath)
+        finally:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+    def _getArHeader(self, name, size):
+        header = f'{name:<16}{int(time.time()):<12}{0:<6}{0:<6}{"100644":<8}{size:<10}`\n'
+        return header.encode('ascii')
+
+    def _writeArMember(self, f, name, writeFunc):
+        headerOffset = f.tell()
+        f.write(self._getArHeader(name, 0))
+        dataOffset = f.tell()
+        writeFunc(f)
+        f.seek(0, os.SEEK_END)
+        size = f.tell() - dataOffset
+        if size % 2 == 1:
+            f.write(b'\n')
+        endOffset = f.tell()
+        f.seek(headerOffset)
+        f.write(self._getArHeader(name, size))
+        f.seek(endOffset)
+
+    def _getControlEntries(self, debianDirPath):
+        entries = [('.', debianDirPath)]
+        for name in sorted(os.listdir(debianDirPath)):
+            entries.append((f'./{name}', os.path.join(debianDirPath, name)))
+        return entries
+
+    def _getDataEntries(self, packageDirPath, streamFileDict):
+        entries = []
+        for dirPath, dirNames, fileNames in os.walk(packageDirPath):
+            if dirPath == packageDirPath and "DEBIAN" in dirNames:
+                dirNames.remove("DEBIAN")
+            for name in [dirPath] + [os.path.join(dirPath, x) for x in fileNames]:
+                entries.append((self._getArchiveName(name, packageDirPath), name))
+        for targetPath, filePath in streamFileDict.items():
+            entries.append((self._getArchiveName(targetPath, packageDirPath), filePath))
+        entries.sort(key=lambda x: x[0].split('/'))
+        return entries
+
+    def _getArchiveName(self, path, packageDirPath):
+        relativePath = os.path.relpath(path, packageDirPath)
+        return '.' if relativePath == '.' else f'./{relativePath}'
+
+    def _writeTar(self, f, entries, compressor):
+        command = {"xz": ["xz", "-T0", "-c", "-q"], "zstd": ["zstd", "-T0", "-c", "-q"]}.get(compressor)
+        if command is not None and shutil.which(command[0]) is not None:
+            # 外部压缩程序直接写入deb文件当前位置，tar数据通过管道流式传入
+            f.flush()
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=f, stderr=subprocess.PIPE)
+            try:
+                self._addTarEntries(process.stdin, entries, 'w|')
+            finally:
+                process.stdin.close()
+                stderr = process.stderr.read()
+                process.wait()
+            if process.returncode != 0:
+                raise Exception(f"{command[0]}压缩出错: {stderr.decode(errors='ignore')}")
+            f.seek(0, os.SEEK_END)
+        elif compressor == "zstd":
+            raise Exception("未找到zstd压缩程序")
+        else:
+            self._addTarEntries(f, entries, {"gz": "w|gz", "xz": "w|xz", "none": "w|"}[compressor])
+
+    def _addTarEntries(self, fileobj, entries, mode):
+        with tarfile.open(fileobj=fileobj, mode=mode, format=tarfile.GNU_FORMAT, dereference=True) as tar:
+            for arcname, sourcePath in entries:
+                info = tar.gettarinfo(sourcePath, arcname)
+                info.uid = info.gid = 0
+                info.uname = info.gname = 'root'
+                if info.isreg():
+                    with open(sourcePath, 'rb') as sourceFile:
+                        reader = _HashingReader(sourceFile)
+                        tar.addfile(info, reader)
+                    fileInfo = self.m_file_info_dict.get(sourcePath)
+                    if fileInfo is None:
+                        fileInfo = FileInfo(sourcePath, info.size, info.mtime)
+                        self.m_file_info_dict[sourcePath] = fileInfo
+                    fileInfo.m_hash = reader.m_digest.hexdigest()
+                else:
+                    tar.addfile(info)
+
     def _getPackDict(self, path):
-        all_files_and_folders = os.listdir(path)
-        if len(all_files_and_folders) > 0:
+        # 使用scandir返回的目录项类型，被排除的目录不再进入
+        matcher = self._getPatternMatcher(self.m_exclude_pack_patterns)
+        dirs_list = [path]
+        while len(dirs_list) > 0:
+            dir_path = dirs_list.pop()
             files_list = []
-            dirs_list = []
-            for item in all_files_and_folders:
-                if self._ignored(item, self.m_exclude_pack_patterns) == False:
-                    item_path = os.path.join(path, item)
-                    if os.path.isdir(item_path):
-                        dirs_list.append(item)
-                    elif os.path.isfile(item_path):
-                        files_list.append(item)
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if matcher(entry.name) is not None:
+                        continue
+                    if entry.is_dir():
+                        dirs_list.append(entry.path)
+                    elif entry.is_file():
+                        files_list.append(entry.name)
+                        stat = entry.stat()
+                        self.m_file_info_dict[entry.path] = FileInfo(entry.path, stat.st_size, stat.st_mtime)
             if len(files_list) > 0:
-                self.m_all_path_dict[path] = files_list
-            for item in dirs_list:
-                self._getPackDict(os.path.join(path, item))
+                self.m_all_path_dict[dir_path] = files_list
+
+    def _getPatternMatcher(self, patterns):
+        # 将全部通配符合并为一个正则表达式，避免对每个名字逐个调用fnmatch
+        key = tuple(patterns)
+        matcher = self.m_pattern_matcher_dict.get(key)
+        if matcher is None:
+            if len(patterns) > 0:
+                matcher = re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns)).match
+            else:
+                matcher = lambda item: None
+            self.m_pattern_matcher_dict[key] = matcher
+        return matcher
 
     def _ignored(self, item, patterns):
-        for pattern in patterns:
-            if fnmatch.fnmatch(item, pattern):
-                return True
-        return False
+        return self._getPatternMatcher(patterns)(item) is not None
 
     def _compileOrCopyFile(self):
         fileDealDict = dict()
@@ -287,47 +705,320 @@ fi
                     else:
                         fileDealDict[(key, file, packPath)] = False
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                futures = []
-                for key, value in fileDealDict.items():
-                    futures.append(executor.submit(self._dealSingleFile, key[0], key[1], key[2], value))
-                doneResults, notDoneResults = concurrent.futures.wait(futures, timeout=None)
-                for future in doneResults:
-                    if future.exception() is not None:
-                        raise future.exception()
+            if self.m_compile_engine == "thread":
+                self._dealFilesInThreads(fileDealDict)
+            else:
+                self._dealFilesInProcesses(fileDealDict)
         except Exception as e:
             raise e
         else:
             print('编译成功')
+            self._printBuildCacheStatistics()
+            self._pruneBuildCache()
+
+    def _dealFilesInThreads(self, fileDealDict):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.m_copy_worker_count) as executor:
+            futures = []
+            for key, value in fileDealDict.items():
+                futures.append(executor.submit(self._dealSingleFile, key[0], key[1], key[2], value))
+            doneResults, notDoneResults = concurrent.futures.wait(futures, timeout=None)
+            for future in doneResults:
+                if future.exception() is not None:
+                    raise future.exception()
+
+    def _dealFilesInProcesses(self, fileDealDict):
+        # 复制文件在线程中进行，需要编译的文件按输出目录分批交给进程池
+        batchDict = dict()
+        compileJobs = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.m_copy_worker_count) as executor:
+            futures = []
+            for (fileDir, fileName, packPath), compileEnable in fileDealDict.items():
+                if compileEnable == False:
+                    futures.append(executor.submit(self._dealSingleFile, fileDir, fileName, packPath, False))
+                    continue
+                moduleName = self._getModuleName(fileDir, fileName)
+                soPath = self._getSoPath(packPath, moduleName)
+                cacheKey = self._getBuildCacheKey(os.path.join(fileDir, fileName), moduleName)
+                compileJobs.append((os.path.join(fileDir, fileName), soPath, cacheKey, moduleName, packPath))
+            bundleJobs = self._getBundleJobs(compileJobs)
+            bundleFileSet = set(job[0] for job in bundleJobs)
+            for filePath, soPath, cacheKey, moduleName, packPath in compileJobs:
+                if filePath in bundleFileSet:
+                    continue
+                if self._loadBuildCache(cacheKey, soPath):
+                    self._submitEncrypt(soPath)
+                else:
+                    batchDict.setdefault(packPath, []).append((filePath, soPath, cacheKey))
+            self._compileBundle(bundleJobs)
+            self._compileBatches(batchDict)
+            doneResults, notDoneResults = concurrent.futures.wait(futures, timeout=None)
+            for future in doneResults:
+                if future.exception() is not None:
+                    raise future.exception()
+        if len(bundleJobs) > 0:
+            self._injectBundleImport()
+
+    def _getBundleJobs(self, compileJobs):
+        if self.m_bundle_enable == False:
+            return []
+        # 只合并从程序根目录可以直接导入的模块；模块名最后一段相同时PyInit函数会重名，这些模块仍然单独编译
+        jobs = [job for job in compileJobs if job[4] == self.m_pack_install_dir_path]
+        nameCounter = collections.Counter(job[3].split('.')[-1] for job in jobs)
+        nameCounter[self.m_bundle_name] += 1
+        jobs = [job for job in jobs if nameCounter[job[3].split('.')[-1]] == 1]
+        return jobs if len(jobs) > 1 else []
+
+    def _getBundleCacheKey(self, jobs):
+        if any(job[2] is None for job in jobs):
+            return None
+        digest = hashlib.sha256()
+        digest.update(BUNDLE_BOOTSTRAP.encode())
+        digest.update(self.m_bundle_name.encode())
+        for filePath, soPath, cacheKey, moduleName, packPath in sorted(jobs, key=lambda x: x[3]):
+            digest.update(f'{moduleName}:{cacheKey}\n'.encode())
+        return digest.hexdigest()
+
+    def _compileBundle(self, jobs):
+        if len(jobs) == 0:
+            return
+        soPath = os.path.join(self.m_pack_install_dir_path, self.m_bundle_name + self.m_ext_suffix)
+        cacheKey = self._getBundleCacheKey(jobs)
+        if self._loadBuildCache(cacheKey, soPath) == False:
+            buildDirPath = os.path.join(self.m_build_dir_path, 'bundle')
+            bootstrapPath = os.path.join(buildDirPath, 'bootstrap', self.m_bundle_name + '.py')
+            os.makedirs(os.path.dirname(bootstrapPath), exist_ok=True)
+            with open(bootstrapPath, 'w') as f:
+                f.write(BUNDLE_BOOTSTRAP.format(moduleNames=sorted(job[3] for job in jobs)))
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                events = executor.submit(_compileBundle, [job[0] for job in jobs] + [bootstrapPath],
+                                         self.m_bundle_name, self.m_pack_install_dir_path, buildDirPath,
+                                         self.m_compiler_directives, self._getCompileWorkerCount()).result()
+            for event in events:
+                self.m_tracer.addEvent(event)
+            self._saveBuildCache(cacheKey, soPath)
+        self._submitEncrypt(soPath)
+        print(f'合并编译{len(jobs)}个模块到{os.path.basename(soPath)}')
+
+    def _injectBundleImport(self):
+        # 打包后的main.py最先导入合并模块以安装模块查找器，插入位置在文件头注释、文档字符串及__future__导入之后
+        mainPath = os.path.join(self.m_current_dir_path, 'main.py')
+        targetPath = os.path.join(self.m_pack_install_dir_path, 'main.py')
+        if mainPath not in self.m_file_info_dict:
+            print(f'未找到{mainPath}，需要在程序启动时手动导入{self.m_bundle_name}')
+            return
+        with open(mainPath, encoding='utf-8') as f:
+            lines = f.read().splitlines(keepends=True)
+        insertLine = 0
+        while insertLine < min(2, len(lines)) and lines[insertLine].startswith('#'):
+            insertLine += 1
+        for index, node in enumerate(ast.parse(''.join(lines)).body):
+            isDocstring = index == 0 and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and \
+                isinstance(node.value.value, str)
+            if isDocstring or (isinstance(node, ast.ImportFrom) and node.module == '__future__'):
+                insertLine = max(insertLine, node.end_lineno)
+            else:
+                break
+        if insertLine > 0 and lines[insertLine - 1].endswith('\n') == False:
+            lines[insertLine - 1] += '\n'
+        lines.insert(insertLine, f'import {self.m_bundle_name}\n')
+        # 打包目录中的main.py可能是源文件的硬链接，先删除再写入，避免修改源文件
+        self.m_stream_file_dict.pop(targetPath, None)
+        if os.path.lexists(targetPath):
+            os.remove(targetPath)
+        with open(targetPath, 'w', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        shutil.copymode(mainPath, targetPath)
+
+    def _getCompileWorkerCount(self):
+        if self.m_compile_worker_count > 0:
+            return self.m_compile_worker_count
+        if hasattr(os, "sched_getaffinity"):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    def _compileBatches(self, batchDict):
+        jobCount = sum(len(jobs) for jobs in batchDict.values())
+        if jobCount == 0:
+            return
+        workerCount = min(self._getCompileWorkerCount(), jobCount)
+        batchSize = max(1, min(self.m_compile_batch_size, math.ceil(jobCount / workerCount)))
+        batches = []
+        for packPath, jobs in batchDict.items():
+            for i in range(0, len(jobs), batchSize):
+                batches.append((packPath, jobs[i:i + batchSize]))
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workerCount, mp_context=context) as executor:
+            futureDict = dict()
+            for index, (packPath, jobs) in enumerate(batches):
+                buildDirPath = os.path.join(self.m_build_dir_path, f'job{index}')
+                future = executor.submit(_compileBatch, [job[0] for job in jobs], packPath, buildDirPath,
+                                         self.m_compiler_directives)
+                futureDict[future] = jobs
+            for future in concurrent.futures.as_completed(futureDict):
+                if future.exception() is not None:
+                    for otherFuture in futureDict:
+                        otherFuture.cancel()
+                    raise future.exception()
+                for event in future.result():
+                    self.m_tracer.addEvent(event)
+                # 每个批次编译完成后立即加密，不必等待全部文件编译完成
+                for filePath, soPath, cacheKey in futureDict[future]:
+                    self._saveBuildCache(cacheKey, soPath)
+                    self._submitEncrypt(soPath)
+
+    def _getSoPath(self, packPath, moduleName):
+        names = moduleName.split('.')
+        return os.path.join(packPath, *names[:-1], names[-1] + self.m_ext_suffix)
 
     def _dealSingleFile(self, fileDir, fileName, packPath, compileEnable):
         filePath = os.path.join(fileDir, fileName)
         if compileEnable:
+            moduleName = self._getModuleName(fileDir, fileName)
+            soPath = self._getSoPath(packPath, moduleName)
+            cacheKey = self._getBuildCacheKey(filePath, moduleName)
+            if self._loadBuildCache(cacheKey, soPath):
+                self._submitEncrypt(soPath)
+                return
             try:
-                setup(
-                    ext_modules=cythonize(
-                        filePath,
-                        build_dir=self.m_build_dir_path,
-                        compiler_directives={"language_level": "3"},
-                    ),
-                    script_args=[
-                        "build_ext",
-                        "-b",
-                        packPath,
-                        "-t",
-                        self.m_build_dir_path,
-                        "-j",
-                        "8",
-                    ],
-                )
+                with self.m_tracer.span(moduleName, "batch"):
+                    with self.m_tracer.span(moduleName, "transpile"):
+                        extensions = cythonize(
+                            filePath,
+                            build_dir=self.m_build_dir_path,
+                            compiler_directives=self.m_compiler_directives,
+                        )
+                    distribution = setup(
+                        ext_modules=extensions,
+                        cmdclass={"build_ext": _TimedBuildExt},
+                        script_args=[
+                            "build_ext",
+                            "-b",
+                            packPath,
+                            "-t",
+                            self.m_build_dir_path,
+                            "-j",
+                            "8",
+                        ],
+                    )
+                for event in distribution.get_command_obj("build_ext").m_events:
+                    self.m_tracer.addEvent(event)
             except Exception as e:
                 raise Exception(f"编译{filePath}文件出错: {e}")
             finally:
                 c_file = os.path.join(fileDir, fileName.split(".")[0] + ".c")
                 if os.path.exists(c_file):
                     os.remove(c_file)
+            self._saveBuildCache(cacheKey, soPath)
+            self._submitEncrypt(soPath)
         else:
+            self._stageFile(filePath, packPath)
+            if fileName.endswith(".so"):
+                self._submitEncrypt(os.path.join(packPath, fileName))
+
+    def _stageFile(self, filePath, packPath):
+        targetPath = os.path.join(packPath, os.path.basename(filePath))
+        if self.m_deb_writer == "stream":
+            # 需要加密的.so仍然复制到打包目录，其余文件只记录源路径，打包时直接读取
+            if self.m_encrypt_executor is None or filePath.endswith(".so") == False:
+                self.m_stream_file_dict[targetPath] = filePath
+                return
             shutil.copy(filePath, packPath)
+            return
+        self._linkOrCopyFile(filePath, targetPath)
+
+    def _linkOrCopyFile(self, filePath, targetPath):
+        # dpkg-deb需要完整的目录树：优先硬链接，其次reflink，都不支持时才复制
+        try:
+            os.link(filePath, targetPath)
+            return
+        except OSError:
+            pass
+        try:
+            with open(filePath, 'rb') as sourceFile, open(targetPath, 'wb') as targetFile:
+                fcntl.ioctl(targetFile.fileno(), FICLONE, sourceFile.fileno())
+            shutil.copymode(filePath, targetPath)
+        except OSError:
+            shutil.copy(filePath, targetPath)
+
+    def _getModuleName(self, fileDir, fileName):
+        # 与cythonize一致：沿着包含__init__.py的目录向上得到模块全名
+        names = [os.path.splitext(fileName)[0]]
+        package_path = fileDir
+        while "__init__.py" in self.m_all_path_dict.get(package_path, []):
+            names.insert(0, os.path.basename(package_path))
+            package_path = os.path.dirname(package_path)
+        return '.'.join(names)
+
+    def _getBuildCacheEnvironment(self):
+        environment = {
+            "cython": Cython.__version__,
+            "directives": self.m_compiler_directives,
+            "python": sys.version,
+            "platform": sysconfig.get_platform(),
+            "ext_suffix": self.m_ext_suffix,
+        }
+        for name in ("CC", "CFLAGS", "CCSHARED", "LDSHARED"):
+            environment[name] = sysconfig.get_config_var(name)
+        for name in ("CC", "CFLAGS", "CPPFLAGS", "LDFLAGS"):
+            environment[f"env_{name}"] = os.environ.get(name, '')
+        return environment
+
+    def _getBuildCacheKey(self, filePath, moduleName):
+        if self.m_build_cache_enable == False:
+            return None
+        digest = hashlib.sha256()
+        # 与cythonize判断是否需要重新编译的依赖一致：源码、同名.pxd及其cimport/include引用的文件
+        for dependPath in sorted(create_dependency_tree().all_dependencies(filePath)):
+            dependInfo = self.m_file_info_dict.get(dependPath) or FileInfo(dependPath)
+            digest.update(os.path.relpath(dependPath, os.path.dirname(filePath)).encode())
+            digest.update(dependInfo.hash().encode())
+        digest.update(moduleName.encode())
+        digest.update(json.dumps(self._getBuildCacheEnvironment(), sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _loadBuildCache(self, cacheKey, soPath):
+        if cacheKey is None:
+            return False
+        cachePath = os.path.join(self.m_build_cache_dir_path, cacheKey[:2], cacheKey + self.m_ext_suffix)
+        hit = os.path.isfile(cachePath)
+        if hit:
+            os.makedirs(os.path.dirname(soPath), exist_ok=True)
+            shutil.copy2(cachePath, soPath)
+            os.utime(cachePath)
+        with self.m_build_cache_lock:
+            if hit:
+                self.m_build_cache_hit_count += 1
+            else:
+                self.m_build_cache_miss_count += 1
+        return hit
+
+    def _saveBuildCache(self, cacheKey, soPath):
+        if cacheKey is None or os.path.isfile(soPath) == False:
+            return
+        try:
+            cachePath = os.path.join(self.m_build_cache_dir_path, cacheKey[:2], cacheKey + self.m_ext_suffix)
+            os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+            # 先写临时文件再重命名，避免并发或中断时留下不完整的缓存
+            tmpPath = f'{cachePath}.{os.getpid()}.{threading.get_ident()}.tmp'
+            shutil.copy2(soPath, tmpPath)
+            os.replace(tmpPath, cachePath)
+        except Exception as e:
+            print(f"写入编译缓存出错: {e}")
+
+    def _pruneBuildCache(self):
+        if self.m_build_cache_enable == False or os.path.exists(self.m_build_cache_dir_path) == False:
+            return
+        cacheFiles = [x for x in pathlib.Path(self.m_build_cache_dir_path).rglob("*.so") if x.is_file()]
+        if len(cacheFiles) > self.m_build_cache_max_count:
+            cacheFiles.sort(key=lambda x: x.stat().st_mtime)
+            for file in cacheFiles[:len(cacheFiles) - self.m_build_cache_max_count]:
+                file.unlink()
+
+    def _printBuildCacheStatistics(self):
+        total = self.m_build_cache_hit_count + self.m_build_cache_miss_count
+        if total > 0:
+            print(f'编译缓存命中 {self.m_build_cache_hit_count}/{total} ({self.m_build_cache_hit_count / total:.1%})')
 
     def _removePackageAndBuildDir(self):
         if os.path.exists(self.m_build_dir_path):
@@ -338,6 +1029,10 @@ fi
     def _getPackFile(self):
         self._removePackageAndBuildDir()
         self.m_all_path_dict.clear()
+        self.m_file_info_dict.clear()
+        self.m_stream_file_dict.clear()
+        self.m_build_cache_hit_count = 0
+        self.m_build_cache_miss_count = 0
         self._getPackDict(self.m_current_dir_path)
         for dir, fileList in self.m_all_path_dict.items():
             delFileList = []
@@ -346,88 +1041,292 @@ fi
                     filePath = os.path.join(dir, file)
                     print(f'remove {filePath}')
                     os.remove(filePath)
+                    self.m_file_info_dict.pop(filePath, None)
                     delFileList.append(file)
             for delFile in delFileList:
                 self.m_all_path_dict[dir].remove(delFile)
 
-    def _encrypt(self, encrypt=False):
-        if encrypt and len(self.m_encrypt_dir_path) > 0:
+    def _startEncrypt(self, encrypt=False):
+        self.m_encrypt_command_list = []
+        self.m_encrypt_file_dict = dict()
+        self.m_encrypt_futures = []
+        if encrypt and len(self.m_encrypt_command) > 0:
+            self.m_encrypt_command_list = self.m_encrypt_command
+        elif encrypt and len(self.m_encrypt_dir_path) > 0:
             toolPath = f'{self.m_encrypt_dir_path}/SentinelTool'
             cfgxPath = f'{self.m_encrypt_dir_path}/Sentinel.cfgx'
             if os.path.exists(toolPath) and os.path.exists(cfgxPath):
-                so_files = [x for x in pathlib.Path(self.m_package_dir_path).rglob("*.so") if x.is_file()]
-                try:
-                    encrypt_fileList = []
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                        futures = []
-                        for file in so_files:
-                            encrypt_file = str(file).replace('.so', '_encrypt.so')
-                            encrypt_fileList.append(encrypt_file)
-                            futures.append(
-                                executor.submit(self._run_command, [toolPath, f'-c:{cfgxPath}', file, encrypt_file]))
-                        doneResults, notDoneResults = concurrent.futures.wait(futures, timeout=None)
-                        for future in doneResults:
-                            if future.exception() is not None:
-                                raise future.exception()
-                except Exception as e:
-                    for file in encrypt_fileList:
-                        if os.path.exists(file):
-                            os.remove(file)
-                    raise Exception(f"加密文件出错: {e}")
-                else:
-                    canEncrypt = True
-                    for encrypt_file in encrypt_fileList:
-                        if pathlib.Path(encrypt_file).exists() == False:
-                            print(f'{encrypt_file}未找到，加密失败')
-                            canEncrypt = False
-                            break
-                    if canEncrypt:
-                        for file in so_files:
-                            if os.path.exists(file):
-                                os.remove(file)
-
-                        for encrypt_file in encrypt_fileList:
-                            source_path = pathlib.Path(encrypt_file)
-                            target_path = pathlib.Path(encrypt_file.replace('_encrypt.so', '.so'))
-                            source_path.rename(target_path)
-                        self.m_deb_file_path = f'{self.m_current_dir_path}/{self.m_software_name}_{self.m_software_version}__{datetime.now().strftime("%Y%m%d")}_{platform.machine()}_encrypted.deb'
-                        print("加密文件成功")
-                    else:
-                        for encrypt_file in encrypt_fileList:
-                            file_path = pathlib.Path(encrypt_file)
-                            if file_path.exists():
-                                file_path.unlink()
+                self.m_encrypt_command_list = [toolPath, f'-c:{cfgxPath}', '{input}', '{output}']
             else:
                 print("不存在加密工具，取消加密文件")
         else:
             print("未加密文件")
+        if len(self.m_encrypt_command_list) > 0:
+            self.m_encrypt_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.m_encrypt_worker_count)
+
+    def _submitEncrypt(self, soPath):
+        # 编译或复制得到.so后立即提交加密，加密结果先写到_encrypt.so，全部成功后再统一替换
+        if self.m_encrypt_executor is None:
+            return
+        encryptPath = soPath[:-len('.so')] + '_encrypt.so'
+        commandList = [x.replace('{input}', soPath).replace('{output}', encryptPath) for x in self.m_encrypt_command_list]
+        with self.m_encrypt_lock:
+            self.m_encrypt_file_dict[soPath] = encryptPath
+            self.m_encrypt_futures.append(self.m_encrypt_executor.submit(self._run_command, commandList))
+
+    def _stopEncrypt(self):
+        if self.m_encrypt_executor is not None:
+            for future in self.m_encrypt_futures:
+                future.cancel()
+            self.m_encrypt_executor.shutdown(wait=True)
+            self.m_encrypt_executor = None
+        for encrypt_file in self.m_encrypt_file_dict.values():
+            if os.path.exists(encrypt_file):
+                os.remove(encrypt_file)
+        self.m_encrypt_file_dict = dict()
+        self.m_encrypt_futures = []
+
+    def _encrypt(self):
+        if self.m_encrypt_executor is None:
+            return
+        try:
+            self.m_encrypt_executor.shutdown(wait=True)
+            self.m_encrypt_executor = None
+            for future in self.m_encrypt_futures:
+                if future.exception() is not None:
+                    raise future.exception()
+        except Exception as e:
+            self._stopEncrypt()
+            raise Exception(f"加密文件出错: {e}")
+        else:
+            canEncrypt = True
+            for encrypt_file in self.m_encrypt_file_dict.values():
+                if pathlib.Path(encrypt_file).exists() == False:
+                    print(f'{encrypt_file}未找到，加密失败')
+                    canEncrypt = False
+                    break
+            if canEncrypt:
+                for file, encrypt_file in self.m_encrypt_file_dict.items():
+                    os.replace(encrypt_file, file)
+                self.m_encrypt_file_dict = dict()
+                self.m_deb_file_path = f'{self.m_current_dir_path}/{self.m_software_name}_{self.m_software_version}__{datetime.now().strftime("%Y%m%d")}_{platform.machine()}_encrypted.deb'
+                print("加密文件成功")
+            else:
+                self._stopEncrypt()
+
+    def _createManifest(self):
+        # 记录包内每个文件的sha256，下次打包时用于生成增量包；stream方式写deb时已在写入过程中计算，
+        # 这里直接复用，dpkg方式才需要重新读取文件
+        self.m_manifest_source_dict = dict()
+        files = dict()
+        for arcname, sourcePath in self._getDataEntries(self.m_package_dir_path, self.m_stream_file_dict):
+            if os.path.isfile(sourcePath):
+                fileInfo = self.m_file_info_dict.get(sourcePath) or FileInfo(sourcePath)
+                fileStat = os.stat(sourcePath)
+                files[arcname] = {
+                    "sha256": fileInfo.hash(),
+                    "size": fileStat.st_size,
+                    "mode": stat.S_IMODE(fileStat.st_mode),
+                }
+                self.m_manifest_source_dict[arcname] = sourcePath
+        self.m_manifest = {
+            "package": self.m_software_name.replace('_', '-'),
+            "version": self.m_software_version.replace('_', '-'),
+            "files": files,
+        }
+        with open(self.m_deb_file_path[:-len('.deb')] + '.manifest.json', 'w') as f:
+            json.dump(self.m_manifest, f, indent=1, sort_keys=True)
+
+    def _packDeltaExec(self):
+        if len(self.m_delta_base_manifest_path) == 0:
+            return
+        try:
+            with open(self.m_delta_base_manifest_path) as f:
+                baseManifest = json.load(f)
+            baseFiles = baseManifest["files"]
+            files = self.m_manifest["files"]
+            changedList = [
+                x for x, info in files.items() if x not in baseFiles or baseFiles[x]["sha256"] != info["sha256"] or
+                baseFiles[x]["mode"] != info["mode"]
+            ]
+            removedList = [x for x in baseFiles if x not in files]
+            # 数据目录与完整包的处理方式一致：不保留旧数据时使用新版本的全部数据，因此数据目录下的文件全部放入增量包
+            packList = list(changedList)
+            if len(self.m_actual_data_dir_path) > 0:
+                dataPrefix = f'.{self.m_actual_data_dir_path}/'
+                packList += [x for x in files if x.startswith(dataPrefix) and x not in changedList]
+
+            patchDirPath = os.path.join(self.m_build_dir_path, "patchExec")
+            packPatchDirPath = os.path.join(patchDirPath, self.m_actual_patch_dir_path[1:])
+            streamFileDict = dict()
+            os.makedirs(os.path.join(packPatchDirPath, 'files'))
+            for arcname in packList:
+                targetPath = os.path.join(packPatchDirPath, 'files', arcname[2:])
+                os.makedirs(os.path.dirname(targetPath), exist_ok=True)
+                if self.m_deb_writer == "stream":
+                    streamFileDict[targetPath] = self.m_manifest_source_dict[arcname]
+                else:
+                    self._linkOrCopyFile(self.m_manifest_source_dict[arcname], targetPath)
+            with open(os.path.join(packPatchDirPath, 'removed.list'), 'w') as f:
+                f.write(''.join(f'{x[2:]}\n' for x in removedList))
+
+            debianDirPath = os.path.join(patchDirPath, "DEBIAN")
+            os.makedirs(debianDirPath)
+            self._createDeltaControlFile(os.path.join(debianDirPath, "control"), baseManifest["version"])
+            self._createDeltaPreinstFile(os.path.join(debianDirPath, "preinst"), baseManifest["version"])
+            self._createDeltaPostinstFile(os.path.join(debianDirPath, "postinst"), baseManifest["version"])
+            deltaFilePath = f'{self.m_deb_file_path[:-len(".deb")]}_patch_from_{baseManifest["version"]}.deb'
+            self._buildDeb(patchDirPath, deltaFilePath, streamFileDict)
+        except Exception as e:
+            raise Exception(f"生成增量包出错: {e}")
+        else:
+            deltaSize = os.path.getsize(deltaFilePath)
+            fullSize = os.path.getsize(self.m_deb_file_path)
+            print(f"生成增量包成功: 修改及新增{len(changedList)}个文件，删除{len(removedList)}个文件，"
+                  f"大小{deltaSize}字节，完整包{fullSize}字节，节省{1 - deltaSize / max(fullSize, 1):.1%}")
+
+    def _createDeltaControlFile(self, file, baseVersion):
+        script_content = f"""Package: {self.m_software_name.replace('_','-')}-patch
+Version: {self.m_software_version.replace('_','-')}
+Section: base
+Priority: optional
+Architecture: all
+Depends: {self.m_software_name.replace('_','-')}
+Maintainer: RVBUST <hr@rvbust.com>
+Description: {self.m_software_description} ({baseVersion} -> {self.m_software_version.replace('_','-')})
+"""
+        self._saveScriptFile(script_content, file)
+
+    def _createDeltaPreinstFile(self, file, baseVersion):
+        # 已安装版本以最近一次应用的增量包为准，没有时使用完整包的版本
+        script_content = f"""#!/bin/sh
+CURRENT_VERSION=$(cat {self.m_patch_version_file_path} 2>/dev/null || dpkg-query -W -f='${{Version}}' {self.m_software_name.replace('_','-')} 2>/dev/null)
+if [ "$1" = "install" ] || [ "$1" = "upgrade" ]; then
+    if [ "$CURRENT_VERSION" != "{baseVersion}" ]; then
+        echo "This patch requires version {baseVersion}, installed version is $CURRENT_VERSION"
+        exit 1
+    fi
+fi
+{self._createHandleeDataDirScript()}
+"""
+        self._saveScriptFile(script_content, file)
+
+    def _createDeltaPostinstFile(self, file, baseVersion):
+        data_str = f'chmod -R 777 {self.m_actual_data_dir_path}' if len(self.m_actual_data_dir_path) > 0 else ''
+        script_content = f"""#!/bin/sh
+echo "applying patch {baseVersion} -> {self.m_software_version.replace('_','-')}..."
+if ! cp -a {self.m_actual_patch_dir_path}/files/. /; then
+    echo "copy patch files failed, keep {self.m_actual_patch_dir_path}"
+    {self._mvDataDir(True).strip().replace(chr(10), chr(10) + '    ')}
+    exit 1
+fi
+while IFS= read -r file; do
+    rm -f "/$file"
+done < {self.m_actual_patch_dir_path}/removed.list
+rm -rf {self.m_actual_patch_dir_path}
+{self._mvDataDir(True)}
+chmod -R 755 {self.m_actual_install_dir_path}
+chown -R root:root {self.m_actual_install_dir_path}
+{data_str}
+echo "{self.m_software_version.replace('_','-')}" > {self.m_patch_version_file_path}
+"""
+        self._saveScriptFile(script_content, file)
 
     def _run_command(self, commandList):
+        start = time.perf_counter()
         try:
             result = subprocess.run(commandList, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        except subprocess.CalledProcessError as e:
+            self._traceCommand(commandList, start, e.returncode, e.stdout, e.stderr)
+            raise Exception(f"{' '.join(str(x) for x in commandList)}返回{e.returncode}: {(e.stderr or '').strip()}")
+        self._traceCommand(commandList, start, result.returncode, result.stdout, result.stderr)
+        return result
+
+    def _traceCommand(self, commandList, start, returncode, stdout, stderr):
+        # 保留外部命令的输出，过长时只保留末尾部分
+        event = _getTraceEvent(os.path.basename(str(commandList[0])), "command", start)
+        event["args"] = {
+            "command": ' '.join(str(x) for x in commandList),
+            "returncode": returncode,
+            "stdout": (stdout or '')[-4000:],
+            "stderr": (stderr or '')[-4000:],
+        }
+        self.m_tracer.addEvent(event)
+
+    def _getTraceSummary(self):
+        phases = dict()
+        for event in self.m_tracer.getEvents("phase"):
+            phases[event["name"]] = event["duration"]
+        modules = collections.defaultdict(lambda: {"transpile_s": 0.0, "compile_s": 0.0})
+        for category in ("transpile", "compile"):
+            for event in self.m_tracer.getEvents(category):
+                modules[event["name"]][f"{category}_s"] += event["duration"]
+        slowestModules = sorted(modules.items(), key=lambda x: x[1]["transpile_s"] + x[1]["compile_s"], reverse=True)
+        # 编译阶段内各编译进程(旧版为线程)处于忙碌状态的时间占比
+        workerBusy = collections.defaultdict(float)
+        for event in self.m_tracer.getEvents("batch"):
+            workerBusy[event["pid"] if self.m_compile_engine == "process" else event["tid"]] += event["duration"]
+        if self.m_compile_engine == "thread":
+            workerCount = self.m_copy_worker_count
+        else:
+            workerCount = self._getCompileWorkerCount()
+        compileTime = phases.get("compile", 0.0)
+        utilization = sum(workerBusy.values()) / (compileTime * workerCount) if compileTime > 0 else 0.0
+        return {
+            "phases_s": phases,
+            "compile_worker_count": workerCount,
+            "compile_worker_utilization": utilization,
+            "worker_busy_s": {str(key): value for key, value in workerBusy.items()},
+            "slowest_modules": [dict(name=name, **value) for name, value in slowestModules[:self.m_trace_top_count]],
+        }
+
+    def _exportTrace(self):
+        try:
+            summary = self._getTraceSummary()
+            print('各阶段耗时: ' + ', '.join(f'{name} {duration:.2f}s' for name, duration in summary["phases_s"].items()))
+            if len(summary["worker_busy_s"]) > 0:
+                print(f'编译进程利用率 {summary["compile_worker_utilization"]:.1%} '
+                      f'({summary["compile_worker_count"]}个)')
+            for module in summary["slowest_modules"][:5]:
+                print(f'  {module["name"]}: 转换{module["transpile_s"]:.2f}s 编译{module["compile_s"]:.2f}s')
+            if len(self.m_trace_path) > 0:
+                self.m_tracer.exportChromeTrace(self.m_trace_path, summary)
+                print(f'编译跟踪已保存到{self.m_trace_path}')
         except Exception as e:
-            raise e
+            print(f"导出编译跟踪出错: {e}")
 
     def compileAndPackExec(self, encrypt=False):
+        self.m_tracer.reset()
         try:
-            self._getPackFile()  #获取打包文件
-            self._compileOrCopyFile()  #编译或者复制文件
-            self._encrypt(encrypt)  #加密.so文件
-            self._createDesktopExec()  #创建桌面图标
-            self._createDEBIANFile()  #创建DEBIAN目录结构
-            self._packExec()  #打包deb文件
+            with self.m_tracer.span("scan"):
+                self._getPackFile()  #获取打包文件
+            self._startEncrypt(encrypt)  #启动加密，编译得到的.so会立即加密
+            with self.m_tracer.span("compile"):
+                self._compileOrCopyFile()  #编译或者复制文件
+            with self.m_tracer.span("encrypt"):
+                self._encrypt()  #等待加密完成并替换.so文件
+            with self.m_tracer.span("debian"):
+                self._createDesktopExec()  #创建桌面图标
+                self._createDEBIANFile()  #创建DEBIAN目录结构
+            with self.m_tracer.span("package"):
+                self._packExec()  #打包deb文件
+            with self.m_tracer.span("manifest"):
+                self._createManifest()  #生成文件清单
+                self._packDeltaExec()  #生成增量包
         except Exception as e:
             print(f"{e},打包终止")
         else:
             print('打包成功')
         finally:
+            self._stopEncrypt()
+            self._exportTrace()
             self._removePackageAndBuildDir()
 
 
 if __name__ == "__main__":
     excludePackPatterns = [
         ".git*", '*.md', "__pycache__", "*.ui", "*.qrc", "*.deb", 'raw_data*', 'MvSdkLog', 'test', 'tmp', 'example',
-        'dependencies', 'doc', 'model_source', "build", "data_jinlv_motoman", "data_rvbust_fanuc", "data_yutong_abb"
+        'dependencies', 'doc', 'benchmarks', 'model_source', "build", "data_jinlv_motoman", "data_rvbust_fanuc", "data_yutong_abb"
     ]
     # from src.common.software_config import software_name, software_main_version, software_sub_version, software_description
     software_name = 'Test'